@@ -0,0 +1,70 @@
+"""
+Synthetic cloned sites for the benchmarks, laid out the way clone writes them:
+files named after the md5 of their path plus a meta.json.
+"""
+
+import hashlib
+import json
+import os
+import random
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore "
+    "magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo"
+).split()
+# number of paragraphs per page
+PAGE_SIZES = {"small": 5, "medium": 50, "large": 500}
+
+
+def make_page(paragraphs, seed=0):
+    rnd = random.Random(seed)
+    parts = [
+        "<!DOCTYPE html><html><head><title>Benchmark page</title>",
+        '<link rel="stylesheet" href="/style.css"><script src="/app.js"></script></head><body>',
+        '<div class="nav"><a href="/index.html">Home</a> <a href="small.html">Small</a> '
+        '<a href="http://example.com/medium.html?page=2">Medium</a> <a href="https://www.external.org/">Out</a> '
+        '<a href="/large.html#top">Large</a> <a href="javascript:void(0)">Menu</a></div>',
+        '<img src="/logo.png" alt="logo">',
+    ]
+    for index in range(paragraphs):
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(20, 60)))
+        if index % 4 == 0:
+            parts.append('<p style="color:#333333;font-size:14px">{}</p>'.format(text))
+        elif index % 7 == 0:
+            parts.append('<p>{} <a href="/small.html">more</a></p>'.format(text))
+        else:
+            parts.append("<p>{}</p>".format(text))
+    parts.append(
+        '<form action="/login.php" method="post"><input name="user"><input name="redirect_to" value="http://example.com/index.html">'
+        '<input type="submit"></form></body></html>'
+    )
+    return "".join(parts)
+
+
+def add_file(directory, meta, path, content, content_type):
+    file_name = hashlib.md5(path.encode("utf-8")).hexdigest()
+    with open(os.path.join(directory, file_name), "wb") as fh:
+        fh.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+    meta[path] = {"hash": file_name, "headers": [{"Content-Type": content_type}]}
+
+
+def create_site(directory):
+    """Writes a small cloned site into directory and returns its meta"""
+    os.makedirs(directory, exist_ok=True)
+    meta = {}
+    add_file(directory, meta, "/index.html", make_page(PAGE_SIZES["medium"]), "text/html; charset=utf-8")
+    for index, (name, paragraphs) in enumerate(sorted(PAGE_SIZES.items())):
+        add_file(directory, meta, "/{}.html".format(name), make_page(paragraphs, index + 1), "text/html; charset=utf-8")
+    add_file(directory, meta, "/style.css", "p { margin: 0 0 1em 0; }\n" * 200, "text/css")
+    add_file(directory, meta, "/app.js", "function f(a) { return a + 1; }\n" * 300, "application/javascript")
+    add_file(
+        directory,
+        meta,
+        "/logo.png",
+        random.Random(0).getrandbits(8 * 200 * 1024).to_bytes(200 * 1024, "little"),
+        "image/png",
+    )
+    add_file(directory, meta, "/status_404", "<html><body><h1>Not Found</h1></body></html>", "text/html")
+    with open(os.path.join(directory, "meta.json"), "w") as meta_fh:
+        json.dump(meta, meta_fh)
+    return meta
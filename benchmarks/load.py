@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+"""
+End-to-end load benchmark: a fake tanner, snare serving a cloned site and a
+concurrent load generator, each in its own process.
+
+    python benchmarks/load.py --concurrency 50 --duration 10
+    python benchmarks/load.py --tanner-latency 20 --set detection_cache_ttl=60 --json
+
+The fake tanner listens on port 8090 of --tanner-host, where snare expects it.
+Without --page-dir a synthetic site is generated in a temporary directory.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import create_site  # noqa: E402
+from snare.server import HttpRequestHandler  # noqa: E402
+
+TANNER_PORT = 8090
+
+
+def parse_mix(mix):
+    # "1:90,2:5,3:5" -> [(1, 90), (2, 5), (3, 5)]
+    weights = []
+    for item in mix.split(","):
+        detection_type, _, weight = item.partition(":")
+        weights.append((int(detection_type), float(weight)))
+    return weights
+
+
+def parse_value(value):
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def fake_tanner(host, latency, mix, ready):
+    weights = parse_mix(mix)
+    types = [detection_type for detection_type, _ in weights]
+    rnd = random.Random(0)
+
+    def detection():
+        detection_type = rnd.choices(types, [weight for _, weight in weights])[0]
+        if detection_type == 1:
+            return {"name": "index", "order": 1, "type": 1, "version": "0.6.0"}
+        if detection_type == 2:
+            payload = {"page": "/index.html", "value": "<script>alert(1)</script>"}
+            return {"name": "xss", "order": 2, "type": 2, "payload": payload, "version": "0.6.0"}
+        return {"name": "lfi", "order": 2, "type": 3, "payload": {"status_code": 403}, "version": "0.6.0"}
+
+    async def event(request):
+        await request.read()
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        message = {"detection": detection(), "sess_uuid": str(uuid.uuid4())}
+        return web.json_response({"version": "0.6.0", "response": {"message": message}})
+
+    async def dorks(request):
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        return web.json_response({"response": {"dorks": ["/dork/{}.php?id={}".format(i, i) for i in range(100)]}})
+
+    async def version(request):
+        return web.json_response({"version": "0.6.0"})
+
+    app = web.Application()
+    app.add_routes([web.post("/event", event), web.get("/dorks", dorks), web.get("/version", version)])
+    web.run_app(app, host=host, port=TANNER_PORT, print=lambda *args: ready.set(), handle_signals=True)
+
+
+def snare_server(run_args, meta):
+    # keep the startup banner out of the results
+    sys.stdout = open(os.devnull, "w")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    handler = HttpRequestHandler(meta, run_args, str(uuid.uuid4()).encode("utf-8"))
+    loop.run_until_complete(handler.start())
+    loop.run_forever()
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("nothing listening on {}:{}".format(host, port))
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+async def generate_load(url, paths, concurrency, duration, warmup):
+    latencies = []
+    statuses = Counter()
+    errors = Counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def worker(seed, until, record):
+            rnd = random.Random(seed)
+            while time.monotonic() < until:
+                path = rnd.choice(paths)
+                started = time.monotonic()
+                try:
+                    async with session.get(url + path) as response:
+                        await response.read()
+                    if record:
+                        latencies.append(time.monotonic() - started)
+                        statuses[response.status] += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if record:
+                        errors[type(e).__name__] += 1
+
+        if warmup > 0:
+            until = time.monotonic() + warmup
+            await asyncio.gather(*(worker(i, until, False) for i in range(concurrency)))
+        started = time.monotonic()
+        until = started + duration
+        await asyncio.gather(*(worker(i, until, True) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    result = dict(
+        requests=len(latencies),
+        errors=dict(errors),
+        statuses={str(status): count for status, count in sorted(statuses.items())},
+        duration=round(elapsed, 3),
+        rps=round(len(latencies) / elapsed, 1),
+    )
+    if latencies:
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            result[name + "_ms"] = round(percentile(latencies, fraction) * 1000, 3)
+        result["max_ms"] = round(latencies[-1] * 1000, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-dir", help="cloned site to serve, a synthetic one by default")
+    parser.add_argument("--port", help="port snare listens on", type=int, default=18080)
+    parser.add_argument(
+        "--tanner-host", help="address of the fake tanner, it listens on port 8090", default="127.0.0.1"
+    )
+    parser.add_argument(
+        "--tanner-latency", help="milliseconds the fake tanner waits before answering", type=float, default=0
+    )
+    parser.add_argument(
+        "--detection-mix", help="weights of the detection types, type:weight,...", default="1:90,2:5,3:5"
+    )
+    parser.add_argument("--concurrency", help="number of concurrent clients", type=int, default=50)
+    parser.add_argument("--duration", help="seconds of measured load", type=float, default=10)
+    parser.add_argument("--warmup", help="seconds of load before measuring", type=float, default=2)
+    parser.add_argument("--dorks", help="inject dorks into the pages", action="store_true")
+    parser.add_argument(
+        "--set", help="snare option as name=value, e.g. detection_cache_ttl=60", action="append", default=[]
+    )
+    parser.add_argument("--json", help="print the results as JSON", action="store_true")
+    args = parser.parse_args()
+
+    page_dir = args.page_dir
+    temp_dir = None
+    if page_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="snare-bench-")
+        page_dir = os.path.join(temp_dir, "site")
+        create_site(page_dir)
+    with open(os.path.join(page_dir, "meta.json")) as meta_fh:
+        meta = json.load(meta_fh)
+    paths = [path for path in meta if path != "/status_404"] + ["/missing.php", "/index.html?id=1"]
+
+    run_args = argparse.Namespace(
+        full_page_path=os.path.realpath(page_dir),
+        tanner=args.tanner_host,
+        no_dorks=not args.dorks,
+        server_header="nginx",
+        slurp_enabled=False,
+        index_page="/index.html",
+        host_ip="127.0.0.1",
+        port=args.port,
+        precompress=False,
+    )
+    for option in args.set:
+        name, _, value = option.partition("=")
+        setattr(run_args, name.replace("-", "_"), parse_value(value))
+
+    context = multiprocessing.get_context("fork")
+    tanner_ready = context.Event()
+    tanner = context.Process(
+        target=fake_tanner, args=(args.tanner_host, args.tanner_latency, args.detection_mix, tanner_ready), daemon=True
+    )
+    tanner.start()
+    tanner_ready.wait(10)
+    server = context.Process(target=snare_server, args=(run_args, meta), daemon=True)
+    server.start()
+    try:
+        wait_for_port("127.0.0.1", args.port)
+        loop = asyncio.new_event_loop()
+        result = loop.run_until_complete(
+            generate_load("http://127.0.0.1:{}".format(args.port), paths, args.concurrency, args.duration, args.warmup)
+        )
+        loop.close()
+    finally:
+        server.terminate()
+        tanner.terminate()
+        server.join()
+        tanner.join()
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir)
+
+    result["config"] = dict(
+        concurrency=args.concurrency,
+        tanner_latency_ms=args.tanner_latency,
+        detection_mix=args.detection_mix,
+        dorks=args.dorks,
+        options={option.partition("=")[0]: option.partition("=")[2] for option in args.set},
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print("{requests} requests in {duration}s, {rps} req/s".format(**result))
+    if result["requests"]:
+        print("latency p50 {p50_ms} ms, p90 {p90_ms} ms, p99 {p99_ms} ms, max {max_ms} ms".format(**result))
+    print("statuses {}".format(result["statuses"]))
+    if result["errors"]:
+        print("errors {}".format(result["errors"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+"""
+Micro-benchmarks of the functions on the request and cloning hot paths, run
+on synthetic pages of several sizes.
+
+    python benchmarks/micro.py --output baseline.json
+    python benchmarks/micro.py --compare baseline.json --threshold 10
+
+With --compare, cases whose median got slower than the baseline by more than
+--threshold percent are reported and the script exits with status 1.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import aiohttp_jinja2
+import jinja2
+import multidict
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import PAGE_SIZES, create_site, make_page  # noqa: E402
+from snare.cloner import Cloner  # noqa: E402
+from snare.html_handler import HtmlHandler  # noqa: E402
+from snare.middlewares import SnareMiddleware  # noqa: E402
+from snare.tanner_handler import TannerHandler  # noqa: E402
+
+LINKS = [
+    "/index.html",
+    "small.html",
+    "http://example.com/medium.html?page=2",
+    "https://www.external.org/",
+    "/large.html#top",
+    "javascript:void(0)",
+    "data:image/png;base64,iVBORw0KGgo=",
+    "../images/logo.png",
+]
+
+
+async def measure(func, iterations, rounds):
+    # per call timings in microseconds, one per round
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        timings.append((time.perf_counter() - started) / iterations * 1e6)
+    return timings
+
+
+class Suite:
+    def __init__(self, directory):
+        self.directory = directory
+        self.site = os.path.join(directory, "pages", "site")
+        self.meta = create_site(self.site)
+        self.pages = {name: make_page(paragraphs).encode("utf-8") for name, paragraphs in PAGE_SIZES.items()}
+        self.cases = []
+        self.add_cases()
+
+    def add(self, name, func, iterations):
+        self.cases.append((name, func, iterations))
+
+    def add_cases(self):
+        # max depth 0, so replace_links does not queue the links it finds
+        cloner = Cloner("http://example.com", 0, None, self.directory)
+        for size, content in self.pages.items():
+            self.add("cloner.replace_links[{}]".format(size), self.replace_links(cloner, content), 2)
+
+        async def process_links():
+            for link in LINKS:
+                await cloner.process_link(link, 0, check_host=True)
+
+        self.add("cloner.process_link[{} links]".format(len(LINKS)), process_links, 200)
+
+        cached = HtmlHandler(True, "127.0.0.1")
+        dorks = HtmlHandler(False, "127.0.0.1", dorks_low_watermark=0)
+        dorks.recycled_dorks.extend("/dork/{}.php".format(index) for index in range(100))
+        for size, content in self.pages.items():
+            self.add("html_handler.handle_content[{}]".format(size), self.handle_content(cached, content), 1000)
+            self.add("html_handler.render_dorks[{}]".format(size), self.render(dorks, content), 2)
+
+        run_args = argparse.Namespace(
+            full_page_path=self.site, tanner="127.0.0.1", no_dorks=True, index_page="/index.html"
+        )
+        tanner_handler = TannerHandler(run_args, self.meta, b"9c10172f-7ce2-4fb4-b1c6-abc70141db56")
+        transport = mock.Mock()
+        transport.get_extra_info.return_value = ("192.0.2.1", 40000)
+        request = make_mocked_request(
+            "GET",
+            "/index.html?id=1",
+            headers={"Host": "example.com", "User-Agent": "Mozilla/5.0", "Cookie": "sess_uuid=abc; theme=dark"},
+            transport=transport,
+        )
+
+        async def create_data():
+            tanner_handler.create_data(request, 200)
+
+        self.add("tanner_handler.create_data", create_data, 2000)
+
+        request_headers = multidict.CIMultiDict({"Host": "example.com"})
+        detections = {
+            "type1[index]": ("/index.html", {"type": 1}),
+            "type1[large]": ("/large.html", {"type": 1}),
+            "type1[missing]": ("/missing.php", {"type": 1}),
+            "type2": ("/index.html", {"type": 2, "payload": {"page": "/index.html", "value": "<script>1</script>"}}),
+            "type3": ("/etc/passwd", {"type": 3, "payload": {"status_code": 403}}),
+        }
+        for name, (path, detection) in detections.items():
+            self.add(
+                "tanner_handler.parse_tanner_response.{}".format(name),
+                self.parse_tanner_response(tanner_handler, path, detection, request_headers),
+                1000,
+            )
+
+        middleware = SnareMiddleware(
+            self.meta["/status_404"]["hash"], headers=self.meta["/status_404"]["headers"], server_header="nginx"
+        )
+        error_middleware = middleware.create_error_middleware({404: middleware.handle_404})
+        app = web.Application()
+        aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(self.site))
+        missing = make_mocked_request("GET", "/missing.php", app=app)
+
+        async def not_found(request):
+            raise web.HTTPNotFound()
+
+        async def handle_404():
+            await error_middleware(missing, not_found)
+
+        self.add("middleware.404", handle_404, 1000)
+
+    @staticmethod
+    def replace_links(cloner, content):
+        async def func():
+            await cloner.replace_links(content, 0)
+
+        return func
+
+    @staticmethod
+    def handle_content(handler, content):
+        async def func():
+            await handler.handle_content(content)
+
+        return func
+
+    @staticmethod
+    def render(handler, content):
+        async def func():
+            await handler.render(content)
+
+        return func
+
+    @staticmethod
+    def parse_tanner_response(handler, path, detection, request_headers):
+        async def func():
+            await handler.parse_tanner_response(path, detection, request_headers)
+
+        return func
+
+    async def run(self, pattern, rounds, scale):
+        results = {}
+        for name, func, iterations in self.cases:
+            if pattern and pattern not in name:
+                continue
+            iterations = max(1, int(iterations * scale))
+            await func()  # warm the caches
+            timings = await measure(func, iterations, rounds)
+            results[name] = dict(
+                iterations=iterations,
+                rounds=rounds,
+                median_us=round(statistics.median(timings), 3),
+                min_us=round(min(timings), 3),
+                max_us=round(max(timings), 3),
+            )
+            print("{:<58} {:>14.1f} us".format(name, results[name]["median_us"]), file=sys.stderr)
+        return results
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL)
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(python=platform.python_version(), platform=platform.platform(), commit=commit, time=time.time())
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print("{:<58} {:>12} {:>12} {:>8}".format("case", "baseline us", "current us", "change"))
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print("{:<58} {:>12} {:>12.1f} {:>8}".format(name, "-", result["median_us"], "new"))
+            continue
+        change = (result["median_us"] / before["median_us"] - 1) * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print(
+            "{:<58} {:>12.1f} {:>12.1f} {:>+7.1f}%{}".format(
+                name, before["median_us"], result["median_us"], change, flag
+            )
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--filter", help="only run the cases whose name contains this string", default=None)
+    parser.add_argument("--rounds", help="number of timed rounds per case", type=int, default=5)
+    parser.add_argument("--scale", help="multiplier of the iterations per round", type=float, default=1.0)
+    parser.add_argument("--output", help="write the results as JSON to this file, - for stdout", default=None)
+    parser.add_argument("--compare", help="baseline JSON file written by --output", default=None)
+    parser.add_argument("--threshold", help="slowdown in percent reported as a regression", type=float, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="snare-micro-")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        suite = Suite(directory)
+        results = loop.run_until_complete(suite.run(args.filter, args.rounds, args.scale))
+    finally:
+        loop.close()
+        shutil.rmtree(directory)
+
+    report = dict(environment=environment(), results=results)
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.threshold)
+        if regressions:
+            print("{} regression(s) above {}%".format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
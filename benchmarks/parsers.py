@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""
+Compares the installed HTML parsers on the pages of a cloned site.
+
+    python benchmarks/parsers.py --page-dir /opt/snare/pages/example.com
+
+For every parser the HTML pages listed in meta.json are parsed and
+serialized, the way HtmlHandler.render and Cloner.replace_links use them.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snare.utils.html_parser import available_parsers, parse_html  # noqa: E402
+from snare.utils.precompress import page_content_type  # noqa: E402
+
+
+def load_pages(page_dir):
+    with open(os.path.join(page_dir, "meta.json")) as meta:
+        meta_info = json.load(meta)
+    pages = []
+    for page in meta_info.values():
+        content_type = page_content_type(page) or ""
+        path = os.path.join(page_dir, page["hash"])
+        if content_type.startswith("text/html") and os.path.isfile(path):
+            with open(path, "rb") as fh:
+                pages.append(fh.read())
+    return pages
+
+
+def bench(parser, pages, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for content in pages:
+            soup = parse_html(content, parser)
+            soup.find_all("p")
+            soup.encode("utf-8")
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-dir", help="directory of a cloned site", required=True)
+    parser.add_argument("--rounds", help="number of passes over all pages", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.page_dir)
+    if not pages:
+        sys.exit("no HTML pages found in {}".format(args.page_dir))
+    size = sum(len(content) for content in pages)
+    print("{} pages, {:.1f} KB".format(len(pages), size / 1024))
+    print("{:<12} {:>10} {:>10} {:>10}".format("parser", "best ms", "mean ms", "MB/s"))
+    for name in available_parsers():
+        best, mean = bench(name, pages, args.rounds)
+        print("{:<12} {:>10.2f} {:>10.2f} {:>10.2f}".format(name, best * 1000, mean * 1000, size / best / 1024 / 1024))
+
+
+if __name__ == "__main__":
+    main()
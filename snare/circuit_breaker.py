@@ -0,0 +1,87 @@
+import logging
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_SLOW_CALL_THRESHOLD = 2.0  # seconds, slower calls count as failures
+DEFAULT_RESET_TIMEOUT = 30.0  # seconds before an open circuit lets a probe through
+
+
+class CircuitBreaker:
+    """Stops calling a service after repeated failures or slow calls, and probes it again after a while"""
+
+    def __init__(
+        self,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        slow_call_threshold=DEFAULT_SLOW_CALL_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        name="tanner",
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.opened = 0
+        self.rejected = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self.probe_started = None
+        return self._state
+
+    def is_open(self):
+        return self.state == OPEN
+
+    def allow(self):
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # one probe at a time, a probe that never reports back is replaced after the reset timeout
+            now = time.monotonic()
+            if self.probe_started is None or now - self.probe_started >= self.reset_timeout:
+                self.probe_started = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, duration=0.0):
+        if duration > self.slow_call_threshold:
+            self.record_failure()
+            return
+        self.failures = 0
+        if self._state != CLOSED:
+            self.logger.info("%s recovered, closing the circuit", self.name)
+            self._state = CLOSED
+            self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            self.trip()
+
+    def trip(self):
+        self.logger.error("%s is failing or slow, opening the circuit for %s seconds", self.name, self.reset_timeout)
+        self._state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started = None
+        self.opened += 1
+
+    def stats(self):
+        return dict(
+            state=STATES.index(self.state),
+            failures=self.failures,
+            opened=self.opened,
+            rejected=self.rejected,
+        )
@@ -8,15 +8,15 @@ import re
 import aiohttp
 import cssutils
 import yarl
-from bs4 import BeautifulSoup
 from asyncio import Queue
 from collections import defaultdict
+from snare.utils.html_parser import DEFAULT_PARSER, parse_html
 
 animation = "|/-\\"
 
 
 class Cloner(object):
-    def __init__(self, root, max_depth, css_validate, default_path="/opt/snare"):
+    def __init__(self, root, max_depth, css_validate, default_path="/opt/snare", parser=DEFAULT_PARSER):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         self.visited_urls = []
@@ -31,6 +31,7 @@ class Cloner(object):
         if not os.path.exists(self.target_path):
             os.makedirs(self.target_path)
         self.css_validate = css_validate
+        self.parser = parser
         self.new_urls = Queue()
         self.meta = defaultdict(dict)
 
@@ -98,7 +99,7 @@ class Cloner(object):
         return res
 
     async def replace_links(self, data, level):
-        soup = BeautifulSoup(data, "html.parser")
+        soup = parse_html(data, self.parser)
 
         # find all relative links
         for link in soup.findAll(href=True):
@@ -0,0 +1,56 @@
+import re
+import time
+from collections import OrderedDict
+
+DEFAULT_DETECTION_CACHE_SIZE = 10000
+
+
+class DetectionCache:
+    """TTL-bounded LRU of Tanner detections, keyed by method, path and query"""
+
+    slashes = re.compile("/+")
+
+    def __init__(self, ttl, max_entries=DEFAULT_DETECTION_CACHE_SIZE, cacheable_types=(1,)):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cacheable_types = cacheable_types
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def make_key(cls, method, path_qs):
+        path, _, query = path_qs.partition("?")
+        path = cls.slashes.sub("/", path)
+        if len(path) > 1 and path[-1] == "/":
+            path = path[:-1]
+        return method, path, query
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, detection = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return detection
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, detection):
+        if detection.get("type") not in self.cacheable_types:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, detection)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self.entries),
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+
+from snare.circuit_breaker import HALF_OPEN
+
+DEFAULT_EVENT_QUEUE_SIZE = 10000
+DEFAULT_EVENT_BATCH_SIZE = 50
+DEFAULT_EVENT_BATCH_AGE = 0.1  # seconds
+QUEUE_POLICIES = ("drop-oldest", "drop-newest")
+PAUSE_CHECK_INTERVAL = 1.0  # seconds
+
+
+class EventPipeline:
+    """Bounded in-memory queue of events, drained in batches by a background sender
+
+    The events of a batch are handed to send concurrently, name is the receiving service in log messages.
+    With a circuit breaker the sender waits while the circuit is open and sends single events, each one
+    a probe the breaker lets through, while it is half-open.
+    """
+
+    def __init__(
+        self,
+        send,
+        max_size=DEFAULT_EVENT_QUEUE_SIZE,
+        batch_size=DEFAULT_EVENT_BATCH_SIZE,
+        batch_age=DEFAULT_EVENT_BATCH_AGE,
+        policy="drop-oldest",
+        paused=None,
+        spool=None,
+        name="tanner",
+        circuit_breaker=None,
+    ):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("Unknown event queue policy: {}".format(policy))
+        self.send = send
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.batch_age = batch_age
+        self.policy = policy
+        self.paused = paused
+        self.spool = spool
+        self.name = name
+        self.circuit_breaker = circuit_breaker
+        self.batch = []
+        self.queue = None
+        self.sender = None
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.high_watermark = 0
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self.sender is None:
+            self.queue = asyncio.Queue(maxsize=self.max_size)
+            self.sender = asyncio.ensure_future(self.run())
+            if self.spool is not None:
+                self.spool.start(self.send, self.is_held)
+
+    def put(self, data):
+        self.start()
+        if self.queue.full():
+            # with a spool the overflow goes to disk, the queue policy applies once the spool is full too
+            if self.spool is not None and self.spool.append(data):
+                return True
+            self.dropped += 1
+            if self.policy == "drop-newest":
+                return False
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(data)
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, self.queue.qsize())
+        return True
+
+    async def next_batch(self):
+        # kept on the pipeline, so close() can spool a batch that was taken from the queue but not sent
+        batch = self.batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.batch_age
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def send_batch(self, batch):
+        # tanner takes one event per request, the batch shares the pooled connections
+        results = await asyncio.gather(*(self.send(data) for data in batch), return_exceptions=True)
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if self.spool is not None:
+            for data, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.spool.append(data)
+        self.failed += failed
+        self.sent += len(batch) - failed
+        self.batches += 1
+        for _ in batch:
+            self.queue.task_done()
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            while batch and self.is_held():
+                if not self.is_paused() and self.is_recovering() and self.circuit_breaker.allow():
+                    await self.send_batch(batch[:1])
+                    batch = self.batch = batch[1:]
+                else:
+                    await asyncio.sleep(PAUSE_CHECK_INTERVAL)
+            if batch:
+                await self.send_batch(batch)
+            self.batch = []
+
+    def is_paused(self):
+        if self.paused is not None and self.paused():
+            return True
+        return self.circuit_breaker is not None and self.circuit_breaker.is_open()
+
+    def is_recovering(self):
+        return self.circuit_breaker is not None and self.circuit_breaker.state == HALF_OPEN
+
+    def is_held(self):
+        # spooled events are replayed only once the service is known to be up again
+        return self.is_paused() or self.is_recovering()
+
+    async def close(self, timeout=10.0):
+        if self.sender is None:
+            return
+        try:
+            # no point waiting for a tanner that is known to be down
+            await asyncio.wait_for(self.queue.join(), 0 if self.is_paused() else timeout)
+        except asyncio.TimeoutError:
+            if self.spool is None:
+                self.logger.error("%d events were not sent to %s before shutdown", self.pending(), self.name)
+        self.sender.cancel()
+        try:
+            await self.sender
+        except asyncio.CancelledError:
+            pass
+        self.sender = None
+        if self.spool is not None:
+            unsent = self.batch
+            while not self.queue.empty():
+                unsent.append(self.queue.get_nowait())
+            for data in unsent:
+                self.spool.append(data)
+            if unsent:
+                self.logger.info("%d unsent events spooled to %s", len(unsent), self.spool.path)
+            self.batch = []
+            await self.spool.close()
+
+    def pending(self):
+        # queued events plus the batch the sender holds, events dropped by drop-oldest were enqueued too
+        evicted = self.dropped if self.policy == "drop-oldest" else 0
+        return self.enqueued - self.sent - self.failed - evicted
+
+    def stats(self):
+        return dict(
+            queued=self.queue.qsize() if self.queue else 0,
+            high_watermark=self.high_watermark,
+            enqueued=self.enqueued,
+            sent=self.sent,
+            failed=self.failed,
+            dropped=self.dropped,
+            batches=self.batches,
+        )
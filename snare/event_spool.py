@@ -0,0 +1,282 @@
+import asyncio
+import fcntl
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SPOOL_MAX_SIZE = 100  # megabytes
+DEFAULT_SPOOL_SEGMENT_SIZE = 4  # megabytes
+DEFAULT_REPLAY_RATE = 50  # events per second
+FSYNC_BATCH = 100  # events written between two fsyncs
+FSYNC_INTERVAL = 1.0  # seconds an event may wait for its fsync
+REPLAY_CHECK_INTERVAL = 1.0  # seconds
+RETRY_INTERVAL = 5.0  # seconds
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def acquire_slot(directory):
+    # every worker process spools into its own numbered directory, locked while the worker runs
+    index = 0
+    while True:
+        path = os.path.join(directory, str(index))
+        os.makedirs(path, exist_ok=True)
+        lock = open(os.path.join(path, "lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            index += 1
+            continue
+        return path, lock
+
+
+def read_segment(path):
+    events = []
+    with open(path, "rb") as segment:
+        for line in segment:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # the last line of a segment written when snare crashed may be cut short
+                continue
+    return events
+
+
+class EventSpool:
+    """Append-only segment files of tanner events that could not be delivered, replayed at a bounded rate
+
+    Events are delivered at least once: a segment is deleted once all of its events were sent, so the
+    events of a segment that was being replayed when snare stopped are sent again after a restart.
+    Appended events are buffered and written, flushed and fsynced in batches on a writer thread of the
+    spool, in order, so the event loop never waits for the disk.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_size=DEFAULT_SPOOL_MAX_SIZE * 1024 * 1024,
+        segment_size=DEFAULT_SPOOL_SEGMENT_SIZE * 1024 * 1024,
+        replay_rate=DEFAULT_REPLAY_RATE,
+        fsync_batch=FSYNC_BATCH,
+        fsync_interval=FSYNC_INTERVAL,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.segment_size = segment_size
+        self.replay_rate = replay_rate
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.path = None
+        self.lock = None
+        # sealed segments, oldest first, and the one being appended to
+        self.segments = []
+        # bytes spooled to every segment, sealed or active
+        self.segment_sizes = {}
+        self.active_path = None
+        self.active_size = 0
+        self.next_index = 0
+        self.size = 0
+        # lines of the active segment not yet handed to the writer thread
+        self.buffer = []
+        self.sync_handle = None
+        # only used on the writer thread
+        self.active = None
+        self.writer = None
+        self.writes = set()
+        self.replay_offset = 0
+        self.replayer = None
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.fsyncs = 0
+        self.logger = logging.getLogger(__name__)
+
+    def open(self):
+        if self.lock is not None:
+            return
+        self.path, self.lock = acquire_slot(self.directory)
+        for name in sorted(os.listdir(self.path)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            path = os.path.join(self.path, name)
+            size = os.path.getsize(path)
+            if size == 0:
+                os.remove(path)
+                continue
+            self.segments.append(path)
+            self.segment_sizes[path] = size
+            self.size += size
+            self.next_index = int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]) + 1
+        if self.segments:
+            self.logger.info("%d bytes of spooled events in %s to replay", self.size, self.path)
+
+    def start(self, send, paused=None):
+        if self.replayer is None:
+            self.replayer = asyncio.ensure_future(self.replay(send, paused))
+
+    def append(self, data):
+        self.open()
+        line = (json.dumps(data, separators=(",", ":")) + "\n").encode("utf-8")
+        if self.size + len(line) > self.max_size:
+            self.dropped += 1
+            return False
+        if self.active_path is None:
+            self.active_path = os.path.join(
+                self.path, "{}{:012d}{}".format(SEGMENT_PREFIX, self.next_index, SEGMENT_SUFFIX)
+            )
+            self.next_index += 1
+            self.active_size = 0
+            self.segment_sizes[self.active_path] = 0
+        self.buffer.append(line)
+        self.active_size += len(line)
+        self.segment_sizes[self.active_path] += len(line)
+        self.size += len(line)
+        self.spooled += 1
+        if self.active_size >= self.segment_size:
+            self.seal()
+        elif len(self.buffer) >= self.fsync_batch:
+            self.sync()
+        elif self.sync_handle is None:
+            self.sync_handle = asyncio.get_event_loop().call_later(self.fsync_interval, self.sync)
+        return True
+
+    def write_lines(self, path, lines, seal):
+        # runs on the writer thread, one call at a time in the order they were made
+        if self.active is None:
+            self.active = open(path, "ab")
+        if lines:
+            self.active.writelines(lines)
+            self.active.flush()
+            os.fsync(self.active.fileno())
+        if seal:
+            self.active.close()
+            self.active = None
+        return bool(lines)
+
+    def written(self, path, lines, seal, future):
+        self.writes.discard(future)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.logger.error("Error writing spooled events to %s: %s", path, future.exception())
+            lost = sum(len(line) for line in lines)
+            self.segment_sizes[path] -= lost
+            self.size -= lost
+            if seal:
+                # a segment that could not be written completely is not replayed, a restart picks up what is on disk
+                self.size -= self.segment_sizes.pop(path)
+            return
+        if future.result():
+            self.fsyncs += 1
+        if seal:
+            # replayed only once everything is on disk
+            self.segments.append(path)
+
+    def sync(self, seal=False):
+        if self.sync_handle is not None:
+            self.sync_handle.cancel()
+            self.sync_handle = None
+        if self.active_path is None or not (self.buffer or seal):
+            return
+        path, lines = self.active_path, self.buffer
+        self.buffer = []
+        if seal:
+            self.active_path = None
+            self.active_size = 0
+        if self.writer is None:
+            self.writer = ThreadPoolExecutor(max_workers=1)
+        future = asyncio.get_event_loop().run_in_executor(self.writer, self.write_lines, path, lines, seal)
+        future.add_done_callback(functools.partial(self.written, path, lines, seal))
+        self.writes.add(future)
+
+    def seal(self):
+        self.sync(seal=True)
+
+    def remove_segment(self, path):
+        self.size -= self.segment_sizes.pop(path)
+        self.segments.remove(path)
+        self.replay_offset = 0
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.error("Error removing spool segment %s: %s", path, e)
+
+    async def send_events(self, events, send):
+        # returns the events that could not be delivered
+        results = await asyncio.gather(*(send(data) for data in events), return_exceptions=True)
+        failed = [data for data, result in zip(events, results) if isinstance(result, Exception)]
+        self.replayed += len(events) - len(failed)
+        return failed
+
+    async def replay_segment(self, path, send, paused):
+        events = await asyncio.get_event_loop().run_in_executor(None, read_segment, path)
+        chunk_size = max(1, min(int(self.replay_rate), 50))
+        while self.replay_offset < len(events):
+            chunk = events[self.replay_offset : self.replay_offset + chunk_size]
+            # failed events stay in their segment and are retried from there, the segment is kept meanwhile
+            while chunk:
+                if paused is not None and paused():
+                    return
+                started = time.monotonic()
+                sent = len(chunk)
+                chunk = await self.send_events(chunk, send)
+                delay = sent / self.replay_rate - (time.monotonic() - started)
+                if chunk:
+                    delay = max(delay, RETRY_INTERVAL)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.replay_offset += chunk_size
+        self.remove_segment(path)
+
+    async def replay(self, send, paused=None):
+        # a worker opens its slot here, after privileges were dropped, so the files belong to the user snare runs as
+        self.open()
+        while True:
+            if paused is not None and paused():
+                await asyncio.sleep(REPLAY_CHECK_INTERVAL)
+                continue
+            if not self.segments and self.active_size:
+                self.seal()
+            if not self.segments:
+                await asyncio.sleep(REPLAY_CHECK_INTERVAL)
+                continue
+            path = self.segments[0]
+            try:
+                await self.replay_segment(path, send, paused)
+            except OSError as e:
+                self.logger.error("Skipping unreadable spool segment %s: %s", path, e)
+                self.remove_segment(path)
+
+    async def close(self):
+        if self.replayer is not None:
+            self.replayer.cancel()
+            try:
+                await self.replayer
+            except asyncio.CancelledError:
+                pass
+            self.replayer = None
+        self.seal()
+        if self.writes:
+            await asyncio.wait(self.writes)
+        if self.writer is not None:
+            self.writer.shutdown()
+            self.writer = None
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+
+    def stats(self):
+        return dict(
+            size=self.size,
+            segments=len(self.segments) + (1 if self.active_path is not None else 0),
+            spooled=self.spooled,
+            replayed=self.replayed,
+            dropped=self.dropped,
+            fsyncs=self.fsyncs,
+        )
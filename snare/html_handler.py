@@ -1,35 +1,228 @@
 import asyncio
 import json
 import logging
+import random
 import cssutils
-import aiohttp
-from bs4 import BeautifulSoup
+from collections import OrderedDict, deque
+from snare.http_client import HttpClient
+from snare.metrics import TANNER_DURATION, TANNER_REQUESTS
+from snare.utils.html_parser import DEFAULT_PARSER, parse_html
+
+DEFAULT_DORK_VARIANTS = 8
+DEFAULT_DORKS_LOW_WATERMARK = 20
+DEFAULT_DORKS_HIGH_WATERMARK = 200
+MAX_VARIANT_PAGES = 512
+DEFAULT_VARIANT_CACHE_SIZE = 64  # megabytes of pages and their rendered variants
+
+
+class VariantPool:
+    """Rotating pool of pre-rendered versions of one page"""
+
+    def __init__(self, size):
+        self.variants = deque(maxlen=size)
+        self.size = 0
+        self.served = 0
+        self.refreshing = False
+
+    def add(self, variant):
+        # returns the change of the pool size in bytes, a full pool drops its oldest variant
+        delta = len(variant)
+        if len(self.variants) == self.variants.maxlen:
+            delta -= len(self.variants[0])
+        self.variants.append(variant)
+        self.size += delta
+        return delta
+
+    def pick(self):
+        variant = self.variants[0]
+        self.variants.rotate(-1)
+        self.served += 1
+        return variant
+
+    def needs_refresh(self):
+        if self.refreshing:
+            return False
+        return len(self.variants) < self.variants.maxlen or self.served % self.variants.maxlen == 0
 
 
 class HtmlHandler:
-    def __init__(self, no_dorks, tanner):
+    def __init__(
+        self,
+        no_dorks,
+        tanner,
+        client=None,
+        dork_variants=DEFAULT_DORK_VARIANTS,
+        dorks_low_watermark=DEFAULT_DORKS_LOW_WATERMARK,
+        dorks_high_watermark=DEFAULT_DORKS_HIGH_WATERMARK,
+        dorks_file=None,
+        parser=DEFAULT_PARSER,
+        variant_cache_size=DEFAULT_VARIANT_CACHE_SIZE * 1024 * 1024,
+    ):
         self.no_dorks = no_dorks
         self.dorks = []
+        # dorks already served, reused when the buffer runs dry
+        self.recycled_dorks = deque(maxlen=dorks_high_watermark)
+        self.dorks_low_watermark = dorks_low_watermark
+        self.dorks_high_watermark = dorks_high_watermark
+        self.dorks_file = dorks_file
+        self.parser = parser
+        self.refill_task = None
         self.logger = logging.getLogger(__name__)
         self.tanner = tanner
+        self.client = client if client else HttpClient()
+        self.dork_variants = dork_variants
+        self.variants = OrderedDict()
+        self.variant_cache_size = variant_cache_size
+        self.variants_size = 0
+        self.refresh_tasks = set()
 
     async def get_dorks(self):
         dorks = None
+        outcome = "error"
         try:
-            async with aiohttp.ClientSession() as session:
-                r = await session.get("http://{0}:8090/dorks".format(self.tanner), timeout=10.0)
-                try:
-                    dorks = await r.json()
-                except json.decoder.JSONDecodeError as e:
-                    self.logger.error("Error getting dorks: %s", e)
-                finally:
-                    await r.release()
+            with TANNER_DURATION.time("dorks"):
+                r = await self.client.session.get("http://{0}:8090/dorks".format(self.tanner), timeout=10.0)
+            try:
+                dorks = await r.json()
+                outcome = "ok"
+            except json.decoder.JSONDecodeError as e:
+                outcome = "invalid"
+                self.logger.error("Error getting dorks: %s", e)
+            finally:
+                await r.release()
         except asyncio.TimeoutError as error:
+            outcome = "timeout"
             self.logger.error("Dorks timeout error: %s", error)
+        finally:
+            TANNER_REQUESTS.inc("dorks", outcome)
         return dorks["response"]["dorks"] if dorks else []
 
+    def load_dorks(self):
+        if not self.dorks_file:
+            return
+        try:
+            with open(self.dorks_file) as dorks_fh:
+                dorks = json.load(dorks_fh)
+        except (OSError, ValueError) as e:
+            self.logger.debug("No saved dorks loaded: %s", e)
+            return
+        self.recycled_dorks.extend(dorks)
+        self.logger.debug("Loaded %d saved dorks from %s", len(dorks), self.dorks_file)
+
+    def save_dorks(self, dorks):
+        try:
+            with open(self.dorks_file, "w") as dorks_fh:
+                json.dump(dorks, dorks_fh)
+        except OSError as e:
+            self.logger.error("Error saving dorks: %s", e)
+
+    async def refill_dorks(self):
+        try:
+            while len(self.dorks) < self.dorks_high_watermark:
+                dorks = await self.get_dorks()
+                if not dorks:
+                    break
+                self.dorks.extend(dorks)
+                if self.dorks_file:
+                    await asyncio.get_event_loop().run_in_executor(None, self.save_dorks, dorks)
+        except Exception as e:
+            self.logger.error("Error refilling dorks: %s", e)
+
+    def start_refill(self):
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.ensure_future(self.refill_dorks())
+        return self.refill_task
+
+    def start(self):
+        if self.no_dorks is not True:
+            self.load_dorks()
+            self.start_refill()
+
+    async def ensure_dorks(self):
+        if not self.dorks and not self.recycled_dorks:
+            # nothing to fall back on yet, only the very first request waits
+            self.dorks.extend(await self.get_dorks())
+
+    def take_dork(self):
+        # also called from render threads, single list and deque operations are atomic
+        try:
+            dork = self.dorks.pop()
+        except IndexError:
+            return random.choice(self.recycled_dorks)
+        self.recycled_dorks.append(dork)
+        return dork
+
+    def check_dorks(self):
+        if len(self.dorks) < self.dorks_low_watermark:
+            self.start_refill()
+
+    async def next_dork(self):
+        await self.ensure_dorks()
+        dork = self.take_dork()
+        self.check_dorks()
+        return dork
+
+    def evict_variants(self):
+        while self.variants and (
+            len(self.variants) > MAX_VARIANT_PAGES or self.variants_size > self.variant_cache_size
+        ):
+            content, pool = self.variants.popitem(last=False)
+            self.variants_size -= len(content) + pool.size
+
     async def handle_content(self, content):
-        soup = BeautifulSoup(content, "html.parser")
+        pool = self.variants.get(content)
+        if pool is None:
+            # dork-free pages always render the same way, one variant is enough
+            pool = VariantPool(1 if self.no_dorks is True else self.dork_variants)
+            pool.add(await self.render(content))
+            if self.variant_cache_size > 0:
+                self.variants[content] = pool
+                self.variants_size += len(content) + pool.size
+                self.evict_variants()
+        else:
+            self.variants.move_to_end(content)
+        variant = pool.pick()
+        if self.no_dorks is not True and pool.needs_refresh():
+            self.refresh(content, pool)
+        return variant
+
+    def refresh(self, content, pool):
+        pool.refreshing = True
+        task = asyncio.ensure_future(self.render_variant(content, pool))
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    async def render_variant(self, content, pool):
+        try:
+            delta = pool.add(await self.render(content))
+            if self.variants.get(content) is pool:
+                self.variants_size += delta
+                self.evict_variants()
+        except Exception as e:
+            self.logger.error("Error rendering page variant: %s", e)
+        finally:
+            pool.refreshing = False
+
+    async def close(self):
+        tasks = set(self.refresh_tasks)
+        if self.refill_task is not None:
+            tasks.add(self.refill_task)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def render(self, content):
+        if self.no_dorks is not True:
+            await self.ensure_dorks()
+        # parsing and re-encoding a large page takes hundreds of milliseconds, requests are served meanwhile
+        rendered = await asyncio.get_event_loop().run_in_executor(None, self.render_page, content)
+        if self.no_dorks is not True:
+            self.check_dorks()
+        return rendered
+
+    def render_page(self, content):
+        soup = parse_html(content, self.parser)
         if self.no_dorks is not True:
             for p_elem in soup.find_all("p"):
                 if p_elem.findChildren():
@@ -40,14 +233,11 @@ class HtmlHandler:
                 text_list = p_elem.text.split()
                 p_new = soup.new_tag("p", style=css.cssText if css else None)
                 for idx, word in enumerate(text_list):
-                    # Fetch dorks if required
-                    if len(self.dorks) <= 0:
-                        self.dorks = await self.get_dorks()
                     word += " "
                     if idx % 5 == 0:
                         a_tag = soup.new_tag(
                             "a",
-                            href=self.dorks.pop(),
+                            href=self.take_dork(),
                             style="color:{color};text-decoration:none;cursor:text;".format(
                                 color=css.color if css and "color" in css.keys() else "#000000"
                             ),
@@ -0,0 +1,34 @@
+import aiohttp
+
+DEFAULT_POOL_SIZE = 100
+DEFAULT_POOL_SIZE_PER_HOST = 20
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+
+
+class HttpClient:
+    """Long-lived aiohttp session shared by the Tanner, dorks and slurp clients"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_size_per_host=DEFAULT_POOL_SIZE_PER_HOST):
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self._session = None
+
+    @property
+    def session(self):
+        # created lazily so the connector is bound to the loop that uses it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
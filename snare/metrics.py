@@ -0,0 +1,145 @@
+import bisect
+import math
+import time
+from collections import OrderedDict
+
+# seconds, from a cached page read up to a stalled tanner
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, str(value).replace('"', '\\"')) for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, format_labels(self.labelnames, labels), value
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.monotonic() - self.started, *self.labels)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum, count]
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def count(self, *labels):
+        series = self.values.get(labels)
+        return series[-1] if series else 0
+
+    def samples(self):
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (math.inf,), series):
+                cumulative += observed
+                le = format_labels(self.labelnames, labels, [("le", format_value(bound))])
+                yield self.name + "_bucket", le, cumulative
+            yield self.name + "_sum", format_labels(self.labelnames, labels), series[-2]
+            yield self.name + "_count", format_labels(self.labelnames, labels), series[-1]
+
+
+class Registry:
+    """In-process metrics, rendered in the prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.collectors = OrderedDict()
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, prefix, stats):
+        # stats() returns a dict of numbers, each one is exposed as a gauge named prefix_key
+        self.collectors[prefix] = stats
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("{}{} {}".format(name, labels, format_value(value)))
+        for prefix, stats in self.collectors.items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = "{}_{}".format(prefix, key)
+                    lines.append("# TYPE {} gauge".format(name))
+                    lines.append("{} {}".format(name, format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter("snare_requests_total", "Requests handled, by method and status", ["method", "status"])
+REQUEST_DURATION = REGISTRY.histogram(
+    "snare_request_duration_seconds", "Time spent on a request, middlewares included", ["method"]
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "snare_stage_duration_seconds", "Time spent in each stage of handling a request", ["stage"]
+)
+TANNER_REQUESTS = REGISTRY.counter(
+    "snare_tanner_requests_total", "Requests sent to tanner, by endpoint and outcome", ["endpoint", "outcome"]
+)
+TANNER_DURATION = REGISTRY.histogram(
+    "snare_tanner_request_duration_seconds", "Round-trip time of the requests sent to tanner", ["endpoint"]
+)
+SLURP_REQUESTS = REGISTRY.counter("snare_slurp_requests_total", "Messages sent to slurp, by outcome", ["outcome"])
+SLURP_DURATION = REGISTRY.histogram("snare_slurp_request_duration_seconds", "Round-trip time of slurp requests")
@@ -1,6 +1,20 @@
+import time
 import aiohttp_jinja2
 import multidict
 from aiohttp import web
+from snare.metrics import REQUEST_DURATION, REQUESTS, STAGE_DURATION
+
+TEMPLATE_CHECK_INTERVAL = 1.0  # seconds between template mtime checks
+# any other method is counted as "other", clients choose the method and would add a label each
+METRIC_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"))
+
+
+class ErrorPage:
+    def __init__(self, template, body, headers):
+        self.template = template
+        self.body = body
+        self.headers = headers
+        self.checked = time.monotonic()
 
 
 class SnareMiddleware:
@@ -16,29 +30,49 @@ class SnareMiddleware:
         if server_header:
             self.headers["Server"] = server_header
 
+        self.error_pages = {}
+
+    def render_error_page(self, request, template_name):
+        page = self.error_pages.get(template_name)
+        if page is not None:
+            now = time.monotonic()
+            if now - page.checked < TEMPLATE_CHECK_INTERVAL:
+                return page
+            if page.template.is_up_to_date:
+                page.checked = now
+                return page
+        template = aiohttp_jinja2.get_env(request.app).get_template(template_name)
+        headers = multidict.CIMultiDict({"Content-Type": "text/html; charset=utf-8"})
+        headers.update(self.headers)
+        page = ErrorPage(template, template.render().encode("utf-8"), multidict.CIMultiDictProxy(headers))
+        self.error_pages[template_name] = page
+        return page
+
+    def error_response(self, request, template_name, status):
+        page = self.render_error_page(request, template_name)
+        return web.Response(body=page.body, status=status, headers=page.headers)
+
     async def handle_404(self, request):
-        return aiohttp_jinja2.render_template(self.error_404, request, {})
+        return self.error_response(request, self.error_404, 404)
 
     async def handle_500(self, request):
-        return aiohttp_jinja2.render_template(self.error_500, request, {})
+        return self.error_response(request, self.error_500, 500)
 
     def create_error_middleware(self, overrides):
         @web.middleware
         async def error_middleware(request, handler):
             try:
                 response = await handler(request)
-                status = response.status
-                override = overrides.get(status)
+                override = overrides.get(response.status)
                 if override:
-                    response = await override(request)
-                    response.headers.update(self.headers)
-                    response.set_status(status)
-                    return response
+                    with STAGE_DURATION.time("error_page"):
+                        return await override(request)
                 return response
             except web.HTTPException as ex:
                 override = overrides.get(ex.status)
                 if override:
-                    return await override(request)
+                    with STAGE_DURATION.time("error_page"):
+                        return await override(request)
                 raise
 
         return error_middleware
@@ -51,3 +85,23 @@ class SnareMiddleware:
             }
         )
         app.middlewares.append(error_middleware)
+
+
+def create_metrics_middleware():
+    @web.middleware
+    async def metrics_middleware(request, handler):
+        started = time.monotonic()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as ex:
+            status = ex.status
+            raise
+        finally:
+            method = request.method if request.method in METRIC_METHODS else "other"
+            REQUEST_DURATION.observe(time.monotonic() - started, method)
+            REQUESTS.inc(method, str(status))
+
+    return metrics_middleware
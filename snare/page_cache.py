@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+DEFAULT_PAGE_CACHE_SIZE = 64  # megabytes
+
+
+class PageCache:
+    """Size-bounded LRU cache of page bodies, keyed by the hashed file name"""
+
+    def __init__(self, directory, max_size):
+        self.dir = directory
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.pages = OrderedDict()
+        self.logger = logging.getLogger(__name__)
+
+    def _read(self, file_name):
+        path = os.path.join(self.dir, file_name)
+        try:
+            with open(path, "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def put(self, file_name, content):
+        if len(content) > self.max_size:
+            return
+        previous = self.pages.pop(file_name, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self.pages[file_name] = content
+        self.size += len(content)
+        while self.size > self.max_size:
+            _, evicted = self.pages.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def get(self, file_name):
+        content = self.pages.get(file_name)
+        if content is not None:
+            self.pages.move_to_end(file_name)
+            self.hits += 1
+            return content
+        self.misses += 1
+        loop = asyncio.get_event_loop()
+        content = await loop.run_in_executor(None, self._read, file_name)
+        if content is not None:
+            self.put(file_name, content)
+        return content
+
+    def preload(self, meta):
+        for page in meta.values():
+            if self.size >= self.max_size:
+                break
+            file_name = page["hash"]
+            if file_name in self.pages:
+                continue
+            content = self._read(file_name)
+            if content is not None:
+                self.put(file_name, content)
+        self.logger.debug("Preloaded %d pages (%d bytes) into the page cache", len(self.pages), self.size)
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self.pages),
+            size=self.size,
+            max_size=self.max_size,
+        )
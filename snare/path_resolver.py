@@ -0,0 +1,112 @@
+import email.utils
+import functools
+import hashlib
+import os
+import re
+from collections import namedtuple
+from urllib.parse import unquote
+
+import multidict
+from snare.utils.precompress import EXTENSIONS
+
+DEFAULT_RESOLVER_CACHE_SIZE = 4096
+
+PageDescriptor = namedtuple(
+    "PageDescriptor",
+    ["file_name", "headers", "content_type", "size", "encodings", "etag", "last_modified", "modified"],
+)
+
+
+class PathResolver:
+    """Maps request paths to prebuilt descriptors of the pages listed in meta.json"""
+
+    slashes = re.compile("/+")
+
+    def __init__(self, meta, directory, index_page, cache_size=DEFAULT_RESOLVER_CACHE_SIZE):
+        self.dir = directory
+        self.pages = {}
+        for path, page in meta.items():
+            descriptor = self.describe(page)
+            if descriptor is not None:
+                self.pages[path] = descriptor
+        if index_page in self.pages:
+            self.pages["/"] = self.pages[index_page]
+        self.resolve = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    def describe(self, page):
+        file_name = page.get("hash")
+        if not file_name:
+            return None
+        headers = multidict.CIMultiDict()
+        for header in page.get("headers", []):
+            for key, value in header.items():
+                headers.add(key, value)
+        # overwrite headers with legacy content-type if present and not none
+        content_type = page.get("content_type")
+        if content_type:
+            headers["Content-Type"] = content_type
+        path = os.path.join(self.dir, file_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        content_type = headers.get("Content-Type", "")
+        # precompressed siblings of the page file, HTML is compressed after rendering instead
+        encodings = ()
+        if not content_type.startswith("text/html"):
+            encodings = tuple(encoding for encoding, ext in EXTENSIONS.items() if os.path.isfile(path + ext))
+        size = etag = last_modified = modified = None
+        if stat is not None:
+            size = stat.st_size
+            etag = '"{}"'.format(self.content_hash(path))
+            # rendered or compressed pages are not byte-identical to the stored file
+            if content_type.startswith("text/html") or encodings:
+                etag = "W/" + etag
+            last_modified, modified = self.last_modified(headers, stat)
+        return PageDescriptor(
+            file_name,
+            multidict.CIMultiDictProxy(headers),
+            content_type,
+            size,
+            encodings,
+            etag,
+            last_modified,
+            modified,
+        )
+
+    @staticmethod
+    def content_hash(path):
+        md5 = hashlib.md5()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                md5.update(chunk)
+        return md5.hexdigest()
+
+    @staticmethod
+    def last_modified(headers, stat):
+        # prefer the date the cloned site reported
+        cloned = headers.get("Last-Modified")
+        if cloned:
+            parsed = email.utils.parsedate_tz(cloned)
+            if parsed is not None:
+                return cloned, email.utils.mktime_tz(parsed)
+        return email.utils.formatdate(stat.st_mtime, usegmt=True), int(stat.st_mtime)
+
+    def lookup(self, path):
+        return self.pages.get(path)
+
+    def _resolve(self, path_qs):
+        # collapse multiple contiguous forward slashes into one
+        path_qs = self.slashes.sub("/", path_qs)
+        possible_requests = [path_qs]
+        query_start = path_qs.find("?")
+        if query_start != -1:
+            possible_requests.append(path_qs[:query_start])
+
+        for requested_name in possible_requests:
+            if len(requested_name) > 1 and requested_name[-1] == "/":
+                requested_name = requested_name[:-1]
+            page = self.pages.get(unquote(requested_name))
+            if page is not None:
+                return page
+        return None
@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from urllib.parse import parse_qsl
+
+from aiohttp import hdrs
+
+DEFAULT_POST_MAX_SIZE = 64  # kilobytes of form fields kept per request
+DEFAULT_UPLOAD_MAX_SIZE = 10  # megabytes stored per uploaded file
+DEFAULT_UPLOAD_DIR_MAX_SIZE = 1024  # megabytes of stored uploads, the oldest are removed beyond
+CHUNK_SIZE = 8192
+SPILL_SIZE = 256 * 1024  # bytes of an upload buffered between two writes to disk
+SPILL_PREFIX = ".upload-"
+LOG_CHUNK_SIZE = 1024  # characters per log line of a long field
+TRUNCATED_MARKER = "...[truncated]"
+
+
+def open_spill(directory):
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=directory, prefix=SPILL_PREFIX, delete=False)
+
+
+def discard_spill(spill):
+    spill.close()
+    os.remove(spill.name)
+
+
+def store_spill(spill, path):
+    spill.close()
+    # identical uploads share one file
+    os.replace(spill.name, path)
+
+
+def prune_uploads(directory, max_size, keep=None):
+    # removes the oldest stored uploads until the directory fits max_size, returns how many were removed
+    uploads = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.startswith(SPILL_PREFIX):
+            stat = entry.stat()
+            uploads.append((stat.st_mtime, entry.path, stat.st_size))
+    size = sum(upload[2] for upload in uploads)
+    removed = 0
+    for _, path, upload_size in sorted(uploads):
+        if size <= max_size:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by another worker
+            pass
+        size -= upload_size
+        removed += 1
+    return removed
+
+
+class PostBody:
+    """Form fields and uploaded files of one POST request"""
+
+    def __init__(self):
+        self.fields = {}
+        self.uploads = []
+        self.size = 0
+        self.kept = 0
+        self.truncated = False
+
+    def add_field(self, name, value, truncated=False):
+        self.kept += len(value)
+        if truncated:
+            value += TRUNCATED_MARKER
+            self.truncated = True
+        self.fields[name] = value
+
+    def add_upload(self, name, filename, content_type, size, stored, sha256, path):
+        # tanner sees the file name in the field, like a form handler would
+        self.fields[name] = filename
+        self.uploads.append(
+            dict(
+                field=name,
+                filename=filename,
+                content_type=content_type,
+                size=size,
+                stored=stored,
+                sha256=sha256,
+                path=path,
+            )
+        )
+        if stored < size:
+            self.truncated = True
+
+    def add_to_event(self, data):
+        data["post_data"] = self.fields
+        if self.truncated:
+            data["post_truncated"] = True
+        if self.uploads:
+            data["post_uploads"] = [
+                {key: value for key, value in upload.items() if key != "path"} for upload in self.uploads
+            ]
+
+    def log(self, logger):
+        # long values are split over several lines instead of one line per field
+        logger.info("POST data:")
+        for key, value in self.fields.items():
+            chunks = [value[i : i + LOG_CHUNK_SIZE] for i in range(0, len(value), LOG_CHUNK_SIZE)] or [""]
+            if len(chunks) == 1:
+                logger.info("\t- {0}: {1}".format(key, value))
+                continue
+            for index, chunk in enumerate(chunks):
+                logger.info("\t- {0} [{1}/{2}]: {3}".format(key, index + 1, len(chunks), chunk))
+        for upload in self.uploads:
+            logger.info("\t- {field}: uploaded {filename}, {size} bytes, sha256 {sha256}".format(**upload))
+            if upload["path"] is not None:
+                logger.info("\t  stored {stored} bytes in {path}".format(**upload))
+        if self.truncated:
+            logger.info("\t  body of %d bytes truncated", self.size)
+
+
+class PostBodyReader:
+    """Streams form bodies with bounded memory
+
+    At most max_size bytes of form fields are kept, longer values are cut and marked. The first
+    upload_max_size bytes of every uploaded file are hashed and, with an upload directory, written there
+    named after their sha256 by the default executor; the oldest files are removed once the directory
+    holds more than upload_dir_max_size bytes. Reading stops after max_size + upload_max_size bytes of body.
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_POST_MAX_SIZE * 1024,
+        upload_dir=None,
+        upload_max_size=DEFAULT_UPLOAD_MAX_SIZE * 1024 * 1024,
+        upload_dir_max_size=DEFAULT_UPLOAD_DIR_MAX_SIZE * 1024 * 1024,
+    ):
+        self.max_size = max_size
+        self.upload_dir = upload_dir
+        self.upload_max_size = upload_max_size
+        self.upload_dir_max_size = upload_dir_max_size
+        self.max_read = max_size + upload_max_size
+        self.logger = logging.getLogger(__name__)
+
+    async def read(self, request):
+        body = PostBody()
+        try:
+            if request.content_type == "multipart/form-data":
+                await self.read_multipart(request, body)
+            elif request.content_type == "application/x-www-form-urlencoded":
+                await self.read_urlencoded(request, body)
+        except Exception as e:
+            # attackers send broken bodies too, keep what was read
+            self.logger.warning("Malformed POST body: %s", e)
+            body.truncated = True
+        return body
+
+    async def read_urlencoded(self, request, body):
+        kept = bytearray()
+        while body.size < self.max_read:
+            chunk = await request.content.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            body.size += len(chunk)
+            if len(kept) < self.max_size:
+                kept.extend(chunk[: self.max_size - len(kept)])
+        fields = parse_qsl(kept.decode(request.charset or "utf-8", "replace"), keep_blank_values=True)
+        truncated = body.size > len(kept)
+        for index, (key, value) in enumerate(fields):
+            # only the last field can have been cut
+            body.add_field(key, value, truncated and index == len(fields) - 1)
+        body.truncated = body.truncated or truncated
+
+    async def read_multipart(self, request, body):
+        reader = await request.multipart()
+        while body.size < self.max_read:
+            part = await reader.next()
+            if part is None:
+                return
+            if part.filename:
+                await self.read_upload(part, body)
+            else:
+                await self.read_field(part, body)
+        body.truncated = True
+
+    async def read_field(self, part, body):
+        limit = max(0, self.max_size - body.kept)
+        value = bytearray()
+        size = 0
+        while body.size < self.max_read:
+            chunk = await part.read_chunk(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            body.size += len(chunk)
+            if len(value) < limit:
+                value.extend(chunk[: limit - len(value)])
+        text = bytes(value).decode(part.get_charset(default="utf-8"), "replace")
+        body.add_field(part.name, text, size > len(value))
+
+    async def store_upload(self, spill, sha256):
+        loop = asyncio.get_event_loop()
+        path = os.path.join(self.upload_dir, sha256)
+        await loop.run_in_executor(None, store_spill, spill, path)
+        if self.upload_dir_max_size:
+            try:
+                removed = await loop.run_in_executor(
+                    None, prune_uploads, self.upload_dir, self.upload_dir_max_size, path
+                )
+            except OSError as e:
+                self.logger.error("Error pruning the upload directory: %s", e)
+            else:
+                if removed:
+                    self.logger.info("Removed %d old uploads from %s", removed, self.upload_dir)
+        return path
+
+    async def read_upload(self, part, body):
+        loop = asyncio.get_event_loop()
+        digest = hashlib.sha256()
+        size = 0
+        stored = 0
+        spill = None
+        pending = bytearray()
+        if self.upload_dir is not None:
+            spill = await loop.run_in_executor(None, open_spill, self.upload_dir)
+        try:
+            while body.size < self.max_read:
+                chunk = await part.read_chunk(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                body.size += len(chunk)
+                if stored < self.upload_max_size:
+                    chunk = chunk[: self.upload_max_size - stored]
+                    digest.update(chunk)
+                    stored += len(chunk)
+                    if spill is not None:
+                        pending.extend(chunk)
+                        if len(pending) >= SPILL_SIZE:
+                            await loop.run_in_executor(None, spill.write, bytes(pending))
+                            pending.clear()
+            if pending:
+                await loop.run_in_executor(None, spill.write, bytes(pending))
+        except BaseException:
+            if spill is not None:
+                discard_spill(spill)
+            raise
+        sha256 = digest.hexdigest()
+        path = None
+        if spill is not None:
+            path = await self.store_upload(spill, sha256)
+        body.add_upload(part.name, part.filename, part.headers.get(hdrs.CONTENT_TYPE), size, stored, sha256, path)
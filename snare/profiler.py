@@ -0,0 +1,90 @@
+import asyncio
+import cProfile
+import glob
+import logging
+import os
+import time
+
+from aiohttp import web
+
+DEFAULT_PROFILE_DURATION = 30  # seconds
+MAX_SLOW_PROFILES = 50
+
+
+class Profiler:
+    """cProfile runs of the event loop, started on demand or for slow requests, written as .prof files"""
+
+    def __init__(self, directory, slow_request_threshold=0):
+        self.directory = directory
+        self.slow_request_threshold = slow_request_threshold  # seconds, 0 disables it
+        self.profile = None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def busy(self):
+        # only one profile can be active on the loop thread
+        return self.profile is not None
+
+    def file_name(self, kind):
+        now = time.time()
+        stamp = "{}.{:03d}".format(time.strftime("%Y%m%d-%H%M%S", time.localtime(now)), int(now % 1 * 1000))
+        return os.path.join(self.directory, "{}-{}-{}.prof".format(kind, os.getpid(), stamp))
+
+    def start(self, duration=DEFAULT_PROFILE_DURATION):
+        if self.busy:
+            self.logger.warning("A profile is already running")
+            return None
+        path = self.file_name("profile")
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        asyncio.get_event_loop().call_later(duration, self.finish, path)
+        self.logger.info("Profiling for %s seconds into %s", duration, path)
+        return path
+
+    def finish(self, path):
+        profile, self.profile = self.profile, None
+        if profile is not None:
+            profile.disable()
+            self.write(profile, path)
+
+    def write(self, profile, path, keep=None):
+        future = asyncio.get_event_loop().run_in_executor(None, self.dump, profile, path, keep)
+        future.add_done_callback(self.dumped)
+        return future
+
+    def dump(self, profile, path, keep):
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(path)
+        if keep is not None:
+            kind = os.path.basename(path).split("-", 1)[0]
+            profiles = sorted(
+                glob.glob(os.path.join(glob.escape(self.directory), kind + "-*.prof")), key=os.path.getmtime
+            )
+            for old in profiles[:-keep]:
+                os.remove(old)
+        return path
+
+    def dumped(self, future):
+        if future.exception() is not None:
+            self.logger.error("Error writing profile: %s", future.exception())
+        else:
+            self.logger.info("Profile written to %s", future.result())
+
+    def create_middleware(self):
+        @web.middleware
+        async def profiling_middleware(request, handler):
+            if self.busy:
+                return await handler(request)
+            # requests served concurrently on the loop show up in the same profile
+            profile = self.profile = cProfile.Profile()
+            started = time.monotonic()
+            profile.enable()
+            try:
+                return await handler(request)
+            finally:
+                profile.disable()
+                self.profile = None
+                if time.monotonic() - started >= self.slow_request_threshold:
+                    self.write(profile, self.file_name("slow"), keep=MAX_SLOW_PROFILES)
+
+        return profiling_middleware
@@ -0,0 +1,143 @@
+import asyncio
+import ipaddress
+import time
+from collections import OrderedDict
+
+import multidict
+from aiohttp import web
+
+DEFAULT_RATE_BURST = 20  # requests
+DEFAULT_SUBNET_RATE_BURST = 100  # requests
+DEFAULT_TARPIT_DELAY = 0.0  # seconds
+MAX_TRACKED_KEYS = 100000
+MAX_TARPITTED = 256  # rejected requests held open at once, the rest are answered right away
+REJECT_REASONS = ("client", "subnet", "in_flight")
+
+
+def subnet_of(ip):
+    # /24 for IPv4, /64 for IPv6
+    if ":" not in ip:
+        return ip.rpartition(".")[0]
+    try:
+        mapped = ipaddress.IPv6Address(ip).ipv4_mapped
+        if mapped is not None:
+            # IPv4 clients of a dual stack socket share the /24 of their IPv4 address
+            return str(mapped).rpartition(".")[0]
+        return str(ipaddress.IPv6Network((ip, 64), strict=False))
+    except ValueError:
+        return ip
+
+
+class TokenBuckets:
+    """Token bucket per key, in an LRU table that forgets buckets once they have refilled"""
+
+    def __init__(self, rate, burst, max_entries=MAX_TRACKED_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        # key -> (tokens, last update), least recently updated first
+        self.buckets = OrderedDict()
+
+    def expire(self, now):
+        while self.buckets:
+            key, (tokens, updated) = next(iter(self.buckets.items()))
+            if tokens + (now - updated) * self.rate < self.burst:
+                break
+            # a full bucket is the same as no bucket
+            del self.buckets[key]
+
+    def take(self, key, now):
+        bucket = self.buckets.pop(key, None)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.expire(now)
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_entries:
+            self.buckets.popitem(last=False)
+        return allowed
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class RateLimiter:
+    """Per client and per subnet request rates plus a cap on the requests handled at once
+
+    Rejected requests never reach tanner: they are held for the tarpit delay and get an empty 503.
+    """
+
+    def __init__(
+        self,
+        rate=0,
+        burst=DEFAULT_RATE_BURST,
+        subnet_rate=0,
+        subnet_burst=DEFAULT_SUBNET_RATE_BURST,
+        max_in_flight=0,
+        tarpit_delay=DEFAULT_TARPIT_DELAY,
+        server_header=None,
+    ):
+        self.clients = TokenBuckets(rate, burst) if rate > 0 else None
+        self.subnets = TokenBuckets(subnet_rate, subnet_burst) if subnet_rate > 0 else None
+        self.max_in_flight = max_in_flight
+        self.tarpit_delay = tarpit_delay
+        self.in_flight = 0
+        self.tarpitted = 0
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+        self.headers = multidict.CIMultiDict({"Retry-After": "1"})
+        if server_header:
+            self.headers["Server"] = server_header
+
+    @property
+    def enabled(self):
+        return self.clients is not None or self.subnets is not None or self.max_in_flight > 0
+
+    def check(self, ip):
+        # returns the reason to reject the request, None to handle it
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return "in_flight"
+        if ip is None:
+            return None
+        now = time.monotonic()
+        if self.clients is not None and not self.clients.take(ip, now):
+            return "client"
+        if self.subnets is not None and not self.subnets.take(subnet_of(ip), now):
+            return "subnet"
+        return None
+
+    async def reject(self, reason):
+        self.rejected[reason] += 1
+        if self.tarpit_delay > 0 and self.tarpitted < MAX_TARPITTED:
+            self.tarpitted += 1
+            try:
+                await asyncio.sleep(self.tarpit_delay)
+            finally:
+                self.tarpitted -= 1
+        return web.Response(status=503, headers=self.headers)
+
+    def create_middleware(self):
+        @web.middleware
+        async def rate_limit_middleware(request, handler):
+            peername = request.transport.get_extra_info("peername") if request.transport else None
+            reason = self.check(peername[0] if isinstance(peername, tuple) else None)
+            if reason is not None:
+                return await self.reject(reason)
+            self.in_flight += 1
+            try:
+                return await handler(request)
+            finally:
+                self.in_flight -= 1
+
+        return rate_limit_middleware
+
+    def stats(self):
+        stats = dict(
+            in_flight=self.in_flight,
+            tarpitted=self.tarpitted,
+            tracked_clients=len(self.clients) if self.clients is not None else 0,
+            tracked_subnets=len(self.subnets) if self.subnets is not None else 0,
+        )
+        for reason, count in self.rejected.items():
+            stats["rejected_" + reason] = count
+        return stats
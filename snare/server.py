@@ -1,13 +1,28 @@
+import asyncio
 import logging
-import aiohttp
+import pathlib
+import signal
+import time
 import aiohttp_jinja2
 import jinja2
 
 from aiohttp import web
 from aiohttp.web import StaticResource as StaticRoute
 
-from snare.middlewares import SnareMiddleware
+from snare.http_client import HttpClient, DEFAULT_POOL_SIZE, DEFAULT_POOL_SIZE_PER_HOST
+from snare.metrics import CONTENT_TYPE, REGISTRY, STAGE_DURATION
+from snare.middlewares import SnareMiddleware, create_metrics_middleware
+from snare.post_body import PostBodyReader, DEFAULT_POST_MAX_SIZE, DEFAULT_UPLOAD_DIR_MAX_SIZE, DEFAULT_UPLOAD_MAX_SIZE
+from snare.profiler import Profiler, DEFAULT_PROFILE_DURATION
+from snare.rate_limiter import RateLimiter, DEFAULT_RATE_BURST, DEFAULT_SUBNET_RATE_BURST, DEFAULT_TARPIT_DELAY
+from snare.slurp_publisher import (
+    SlurpPublisher,
+    DEFAULT_SLURP_QUEUE_SIZE,
+    DEFAULT_SLURP_BATCH_SIZE,
+    DEFAULT_SLURP_RETRIES,
+)
 from snare.tanner_handler import TannerHandler
+from snare.utils.logger import REQUEST_LOGGER
 
 
 class HttpRequestHandler:
@@ -18,43 +33,94 @@ class HttpRequestHandler:
         self.snare_uuid = snare_uuid
         self.logger = logging.getLogger(__name__)
         self.sroute = StaticRoute(name=None, prefix="/", directory=self.dir)
-        self.tanner_handler = TannerHandler(run_args, meta, snare_uuid)
-
-    async def submit_slurp(self, data):
-        try:
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-                r = await session.post(
-                    "https://{0}:8080/api?auth={1}&chan=snare_test&msg={2}".format(
-                        self.run_args.slurp_host, self.run_args.slurp_auth, data
-                    ),
-                    json=data,
-                    timeout=10.0,
-                )
-                assert r.status == 200
-                r.close()
-        except Exception as e:
-            self.logger.error("Error submitting slurp: %s", e)
+        self.client = HttpClient(
+            getattr(run_args, "client_pool_size", DEFAULT_POOL_SIZE),
+            getattr(run_args, "client_pool_size_per_host", DEFAULT_POOL_SIZE_PER_HOST),
+        )
+        self.tanner_handler = TannerHandler(run_args, meta, snare_uuid, self.client)
+        self.post_reader = PostBodyReader(
+            getattr(run_args, "post_max_size", DEFAULT_POST_MAX_SIZE) * 1024,
+            upload_dir=getattr(run_args, "upload_dir", None),
+            upload_max_size=getattr(run_args, "upload_max_size", DEFAULT_UPLOAD_MAX_SIZE) * 1024 * 1024,
+            upload_dir_max_size=getattr(run_args, "upload_dir_max_size", DEFAULT_UPLOAD_DIR_MAX_SIZE) * 1024 * 1024,
+        )
+        self.request_logger = logging.getLogger(REQUEST_LOGGER) if getattr(run_args, "request_log", False) else None
+        self.admin_runner = None
+        self.profiler = None
+        if getattr(run_args, "profile_dir", None):
+            self.profiler = Profiler(run_args.profile_dir, getattr(run_args, "profile_slow_requests", 0) / 1000)
+        self.rate_limiter = RateLimiter(
+            rate=getattr(run_args, "rate_limit", 0),
+            burst=getattr(run_args, "rate_burst", DEFAULT_RATE_BURST),
+            subnet_rate=getattr(run_args, "subnet_rate_limit", 0),
+            subnet_burst=getattr(run_args, "subnet_rate_burst", DEFAULT_SUBNET_RATE_BURST),
+            max_in_flight=getattr(run_args, "max_in_flight", 0),
+            tarpit_delay=getattr(run_args, "tarpit_delay", DEFAULT_TARPIT_DELAY),
+            server_header=getattr(run_args, "server_header", None),
+        )
+        self.slurp_publisher = None
+        if getattr(run_args, "slurp_enabled", False):
+            self.slurp_publisher = SlurpPublisher(
+                self.client,
+                getattr(run_args, "slurp_host", None),
+                getattr(run_args, "slurp_auth", None),
+                max_size=getattr(run_args, "slurp_queue_size", DEFAULT_SLURP_QUEUE_SIZE),
+                batch_size=getattr(run_args, "slurp_batch_size", DEFAULT_SLURP_BATCH_SIZE),
+                retries=getattr(run_args, "slurp_retries", DEFAULT_SLURP_RETRIES),
+            )
+            REGISTRY.add_collector("snare_slurp_queue", self.slurp_publisher.stats)
+        if self.rate_limiter.enabled:
+            REGISTRY.add_collector("snare_rate_limit", self.rate_limiter.stats)
+        REGISTRY.add_collector("snare_event_queue", self.tanner_handler.event_pipeline.stats)
+        REGISTRY.add_collector("snare_page_cache", self.tanner_handler.page_cache.stats)
+        if self.tanner_handler.detection_cache is not None:
+            REGISTRY.add_collector("snare_detection_cache", self.tanner_handler.detection_cache.stats)
+        if self.tanner_handler.circuit_breaker is not None:
+            REGISTRY.add_collector("snare_tanner_circuit", self.tanner_handler.circuit_breaker.stats)
+        if self.tanner_handler.event_spool is not None:
+            REGISTRY.add_collector("snare_event_spool", self.tanner_handler.event_spool.stats)
+
+    def log_request(self, request, data, detection, status_code, started, tanner_time):
+        self.request_logger.info(
+            {
+                "peer": data["peer"]["ip"] if data.get("peer") else None,
+                "method": request.method,
+                "path": request.path_qs,
+                "user_agent": request.headers.get("User-Agent"),
+                "post_fields": len(data.get("post_data", ())),
+                "detection": detection.get("name"),
+                "detection_type": detection.get("type"),
+                "status": status_code,
+                "tanner_ms": round(tanner_time * 1000, 3),
+                "total_ms": round((time.monotonic() - started) * 1000, 3),
+            }
+        )
 
     async def handle_request(self, request):
+        started = time.monotonic()
         self.logger.info("Request path: {0}".format(request.path_qs))
         data = self.tanner_handler.create_data(request, 200)
         if request.method == "POST":
-            post_data = await request.post()
-            self.logger.info("POST data:")
-            for key, val in post_data.items():
-                self.logger.info("\t- {0}: {1}".format(key, val))
-            data["post_data"] = dict(post_data)
+            with STAGE_DURATION.time("post_body"):
+                post_body = await self.post_reader.read(request)
+            post_body.log(self.logger)
+            post_body.add_to_event(data)
 
         # Submit the event to the TANNER service
-        event_result = await self.tanner_handler.submit_data(data)
+        tanner_started = time.monotonic()
+        event_result = await self.tanner_handler.get_event_result(data)
+        tanner_time = time.monotonic() - tanner_started
+        STAGE_DURATION.observe(tanner_time, "tanner")
 
-        # Log the event to slurp service if enabled
-        if self.run_args.slurp_enabled:
-            await self.submit_slurp(request.path_qs)
+        # Log the event to slurp service if enabled, sent in the background
+        if self.slurp_publisher is not None:
+            self.slurp_publisher.put(request.path_qs)
 
-        content, headers, status_code = await self.tanner_handler.parse_tanner_response(
-            request.path_qs, event_result["response"]["message"]["detection"]
-        )
+        detection = event_result["response"]["message"]["detection"]
+        with STAGE_DURATION.time("response"):
+            content, headers, status_code = await self.tanner_handler.parse_tanner_response(
+                request.path_qs, detection, request.headers, request.method
+            )
 
         if self.run_args.server_header:
             headers["Server"] = self.run_args.server_header
@@ -69,9 +135,40 @@ class HttpRequestHandler:
             if previous_sess_uuid is None or not previous_sess_uuid.strip() or previous_sess_uuid != cur_sess_id:
                 headers.add("Set-Cookie", "sess_uuid=" + cur_sess_id)
 
-        return web.Response(body=content, status=status_code, headers=headers)
+        if isinstance(content, pathlib.Path):
+            # sendfile with range and conditional request support
+            response = web.FileResponse(content, status=status_code, headers=headers)
+        else:
+            response = web.Response(body=content, status=status_code, headers=headers)
+        if self.request_logger is not None:
+            self.log_request(request, data, detection, status_code, started, tanner_time)
+        return response
+
+    async def handle_metrics(self, request):
+        return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
 
-    async def start(self):
+    async def handle_profile(self, request):
+        if self.profiler is None:
+            raise web.HTTPNotFound()
+        try:
+            duration = float(request.query.get("seconds", DEFAULT_PROFILE_DURATION))
+        except ValueError:
+            raise web.HTTPBadRequest(text="seconds must be a number")
+        path = self.profiler.start(duration)
+        if path is None:
+            raise web.HTTPConflict(text="a profile is already running")
+        return web.json_response({"file": path, "seconds": duration})
+
+    async def start_admin(self):
+        # kept apart from the honeypot port, so that attackers never see it
+        app = web.Application()
+        app.add_routes([web.get("/metrics", self.handle_metrics), web.post("/profile", self.handle_profile)])
+        self.admin_runner = web.AppRunner(app)
+        await self.admin_runner.setup()
+        site = web.TCPSite(self.admin_runner, self.run_args.metrics_host, self.run_args.metrics_port)
+        await site.start()
+
+    async def start(self, sock=None):
         app = web.Application()
         app.add_routes([web.route("*", "/{tail:.*}", self.handle_request)])
         aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(self.dir))
@@ -81,14 +178,40 @@ class HttpRequestHandler:
             server_header=self.run_args.server_header,
         )
         middleware.setup_middlewares(app)
+        if self.rate_limiter.enabled:
+            # ahead of everything else, rejected requests cost no tanner call, disk read or parsing
+            app.middlewares.insert(0, self.rate_limiter.create_middleware())
+        # outermost, so the error pages are included in the request time
+        app.middlewares.insert(0, create_metrics_middleware())
+        if self.profiler is not None:
+            if self.profiler.slow_request_threshold > 0:
+                app.middlewares.insert(0, self.profiler.create_middleware())
+            asyncio.get_event_loop().add_signal_handler(signal.SIGUSR1, self.profiler.start)
+        self.tanner_handler.page_cache.preload(self.meta)
+        self.tanner_handler.html_handler.start()
+        # replays events spooled by a previous run
+        self.tanner_handler.event_pipeline.start()
 
         self.runner = web.AppRunner(app)
         await self.runner.setup()
-        site = web.TCPSite(self.runner, self.run_args.host_ip, self.run_args.port)
+        if sock is None:
+            site = web.TCPSite(self.runner, self.run_args.host_ip, self.run_args.port)
+        else:
+            site = web.SockSite(self.runner, sock)
 
         await site.start()
         names = sorted(str(s.name) for s in self.runner.sites)
         print("======== Running on {} ========\n" "(Press CTRL+C to quit)".format(", ".join(names)))
+        if getattr(self.run_args, "metrics_port", 0):
+            await self.start_admin()
 
     async def stop(self):
+        if self.profiler is not None:
+            asyncio.get_event_loop().remove_signal_handler(signal.SIGUSR1)
         await self.runner.cleanup()
+        if self.admin_runner is not None:
+            await self.admin_runner.cleanup()
+        await self.tanner_handler.close()
+        if self.slurp_publisher is not None:
+            await self.slurp_publisher.close()
+        await self.client.close()
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+from snare.event_pipeline import EventPipeline
+from snare.metrics import SLURP_DURATION, SLURP_REQUESTS
+
+DEFAULT_SLURP_QUEUE_SIZE = 10000
+DEFAULT_SLURP_BATCH_SIZE = 50
+DEFAULT_SLURP_RETRIES = 3
+SLURP_BATCH_AGE = 0.5  # seconds
+SLURP_CHANNEL = "snare_test"
+RETRY_BACKOFF = 1.0  # seconds, doubled after every failed attempt
+MAX_RETRY_BACKOFF = 30.0  # seconds
+SLURP_TIMEOUT = 10.0  # seconds
+
+
+class SlurpPublisher:
+    """Publishes slurp messages in the background from a bounded EventPipeline
+
+    Every message is posted to the api endpoint on its own, the messages of a batch concurrently over the
+    pooled connections. Failed requests are retried with exponential backoff, the oldest messages are
+    dropped while the queue is full.
+    """
+
+    def __init__(
+        self,
+        client,
+        host,
+        auth,
+        max_size=DEFAULT_SLURP_QUEUE_SIZE,
+        batch_size=DEFAULT_SLURP_BATCH_SIZE,
+        retries=DEFAULT_SLURP_RETRIES,
+        batch_age=SLURP_BATCH_AGE,
+    ):
+        self.client = client
+        self.host = host
+        self.auth = auth
+        self.retries = retries
+        self.retried = 0
+        self.pipeline = EventPipeline(
+            self.send, max_size=max_size, batch_size=batch_size, batch_age=batch_age, name="slurp"
+        )
+        self.logger = logging.getLogger(__name__)
+
+    def put(self, message):
+        return self.pipeline.put(message)
+
+    async def publish(self, message):
+        url = "https://{0}:8080/api".format(self.host)
+        params = dict(auth=self.auth, chan=SLURP_CHANNEL, msg=message)
+        with SLURP_DURATION.time():
+            r = await self.client.session.post(url, params=params, json=message, timeout=SLURP_TIMEOUT, ssl=False)
+            try:
+                if r.status != 200:
+                    raise RuntimeError("slurp answered with status {}".format(r.status))
+            finally:
+                await r.release()
+
+    async def send(self, message):
+        # raises once every attempt failed, so the pipeline counts the message as failed
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_RETRY_BACKOFF))
+            try:
+                await self.publish(message)
+            except Exception as e:
+                self.logger.error("Error submitting slurp: %s", e)
+                error = e
+                continue
+            SLURP_REQUESTS.inc("ok")
+            return
+        SLURP_REQUESTS.inc("error")
+        raise error
+
+    async def close(self, timeout=5.0):
+        await self.pipeline.close(timeout)
+
+    def stats(self):
+        stats = self.pipeline.stats()
+        stats["retried"] = self.retried
+        return stats
@@ -0,0 +1,88 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+MIN_WORKER_UPTIME = 1.0  # seconds, faster exits are treated as a crash loop
+RESTART_DELAY = 1.0
+
+
+def create_reuseport_socket(host, port, backlog=128):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class Supervisor:
+    """Forks one worker per listening socket and restarts the ones that die"""
+
+    def __init__(self, sockets, serve):
+        self.sockets = sockets
+        self.serve = serve
+        self.workers = {}  # pid -> (socket index, start time)
+        self.stopping = False
+        self.logger = logging.getLogger(__name__)
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            # the supervisor relays ctrl+c to the workers as SIGTERM
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            # until the worker installs its own profiling handler
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            exit_code = 0
+            try:
+                self.serve(self.sockets[index])
+            except BaseException:
+                self.logger.exception("Worker %d crashed", os.getpid())
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = (index, time.monotonic())
+        self.logger.info("Started worker %d on socket %d", pid, index)
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def relay(self, signum, frame=None):
+        for pid in self.workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        # profile all the workers at once
+        signal.signal(signal.SIGUSR1, self.relay)
+        for index in range(len(self.sockets)):
+            self.spawn(index)
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            if pid not in self.workers:
+                continue
+            index, started = self.workers.pop(pid)
+            if self.stopping:
+                continue
+            self.logger.error("Worker %d exited with status %d, restarting it", pid, status)
+            if time.monotonic() - started < MIN_WORKER_UPTIME:
+                time.sleep(RESTART_DELAY)
+            self.spawn(index)
+        for sock in self.sockets:
+            sock.close()
@@ -1,22 +1,112 @@
-import re
-import os
+import email.utils
+import pathlib
 import multidict
+from collections import OrderedDict
 import json
 import logging
+import time
 import aiohttp
 
-from urllib.parse import unquote
-from bs4 import BeautifulSoup
-from snare.html_handler import HtmlHandler
+from snare.circuit_breaker import (
+    CircuitBreaker,
+    DEFAULT_FAILURE_THRESHOLD,
+    DEFAULT_SLOW_CALL_THRESHOLD,
+    DEFAULT_RESET_TIMEOUT,
+)
+from snare.detection_cache import DetectionCache, DEFAULT_DETECTION_CACHE_SIZE
+from snare.event_pipeline import (
+    EventPipeline,
+    DEFAULT_EVENT_QUEUE_SIZE,
+    DEFAULT_EVENT_BATCH_SIZE,
+)
+from snare.event_spool import EventSpool, DEFAULT_SPOOL_MAX_SIZE, DEFAULT_SPOOL_SEGMENT_SIZE, DEFAULT_REPLAY_RATE
+from snare.html_handler import (
+    HtmlHandler,
+    DEFAULT_DORK_VARIANTS,
+    DEFAULT_DORKS_LOW_WATERMARK,
+    DEFAULT_DORKS_HIGH_WATERMARK,
+)
+from snare.http_client import HttpClient
+from snare.metrics import STAGE_DURATION, TANNER_DURATION, TANNER_REQUESTS
+from snare.page_cache import PageCache, DEFAULT_PAGE_CACHE_SIZE
+from snare.path_resolver import PathResolver
+from snare.utils.html_parser import parse_fragment, parse_html, select_parser
+from snare.utils.precompress import (
+    EXTENSIONS,
+    MIN_COMPRESS_SIZE,
+    available_encodings,
+    compress,
+    is_compressible,
+    negotiate_encoding,
+)
+
+DEFAULT_SENDFILE_THRESHOLD = 64  # kilobytes
+MAX_COMPRESSED_BODIES = 256
+EMPTY_PAGE = b"<html><body></body></html>"
+DEFAULT_TANNER_TIMEOUT = 10.0  # seconds
+LOCAL_DETECTION = {"name": "index", "order": 1, "type": 1, "version": "0.6.0"}
 
 
 class TannerHandler:
-    def __init__(self, run_args, meta, snare_uuid):
+    def __init__(self, run_args, meta, snare_uuid, client=None):
         self.run_args = run_args
         self.meta = meta
         self.dir = run_args.full_page_path
         self.snare_uuid = snare_uuid
-        self.html_handler = HtmlHandler(run_args.no_dorks, run_args.tanner)
+        self.client = client if client else HttpClient()
+        self.parser = select_parser(getattr(run_args, "html_parser", None))
+        page_cache_size = getattr(run_args, "page_cache_size", DEFAULT_PAGE_CACHE_SIZE)
+        self.html_handler = HtmlHandler(
+            run_args.no_dorks,
+            run_args.tanner,
+            self.client,
+            getattr(run_args, "dork_variants", DEFAULT_DORK_VARIANTS),
+            getattr(run_args, "dorks_low_watermark", DEFAULT_DORKS_LOW_WATERMARK),
+            getattr(run_args, "dorks_high_watermark", DEFAULT_DORKS_HIGH_WATERMARK),
+            getattr(run_args, "dorks_file", None),
+            self.parser,
+            # rendered pages get a budget of the same size as the page cache
+            page_cache_size * 1024 * 1024,
+        )
+        self.page_cache = PageCache(self.dir, page_cache_size * 1024 * 1024)
+        self.compressed_bodies = OrderedDict()
+        self.injection_points = {}
+        self.sendfile_threshold = getattr(run_args, "sendfile_threshold", DEFAULT_SENDFILE_THRESHOLD) * 1024
+        self.path_resolver = PathResolver(meta, self.dir, getattr(run_args, "index_page", "/index.html"))
+        detection_cache_ttl = getattr(run_args, "detection_cache_ttl", 0)
+        self.detection_cache = None
+        if detection_cache_ttl > 0:
+            self.detection_cache = DetectionCache(
+                detection_cache_ttl, getattr(run_args, "detection_cache_size", DEFAULT_DETECTION_CACHE_SIZE)
+            )
+        self.tanner_timeout = getattr(run_args, "tanner_timeout", DEFAULT_TANNER_TIMEOUT)
+        failure_threshold = getattr(run_args, "tanner_failure_threshold", DEFAULT_FAILURE_THRESHOLD)
+        self.circuit_breaker = None
+        if failure_threshold > 0:
+            self.circuit_breaker = CircuitBreaker(
+                failure_threshold,
+                getattr(run_args, "tanner_slow_threshold", DEFAULT_SLOW_CALL_THRESHOLD),
+                getattr(run_args, "tanner_reset_timeout", DEFAULT_RESET_TIMEOUT),
+            )
+        self.event_spool = None
+        spool_dir = getattr(run_args, "spool_dir", None)
+        spool_max_size = getattr(run_args, "spool_max_size", DEFAULT_SPOOL_MAX_SIZE)
+        if spool_dir and spool_max_size > 0:
+            self.event_spool = EventSpool(
+                spool_dir,
+                max_size=spool_max_size * 1024 * 1024,
+                segment_size=getattr(run_args, "spool_segment_size", DEFAULT_SPOOL_SEGMENT_SIZE) * 1024 * 1024,
+                replay_rate=getattr(run_args, "spool_replay_rate", DEFAULT_REPLAY_RATE),
+            )
+        self.event_pipeline = EventPipeline(
+            self.forward_data,
+            max_size=getattr(run_args, "event_queue_size", DEFAULT_EVENT_QUEUE_SIZE),
+            batch_size=getattr(run_args, "event_batch_size", DEFAULT_EVENT_BATCH_SIZE),
+            policy=getattr(run_args, "event_queue_policy", "drop-oldest"),
+            # queued events wait while tanner is known to be down and probe it one by one while it recovers
+            spool=self.event_spool,
+            circuit_breaker=self.circuit_breaker,
+        )
         self.logger = logging.getLogger(__name__)
 
     def create_data(self, request, response_status):
@@ -47,111 +137,230 @@ class TannerHandler:
 
     async def submit_data(self, data):
         event_result = None
+        outcome = "error"
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
-                r = await session.post(
+            with TANNER_DURATION.time("event"):
+                r = await self.client.session.post(
                     "http://{0}:8090/event".format(self.run_args.tanner),
                     json=data,
-                    timeout=10.0,
+                    timeout=self.tanner_timeout,
                 )
-                try:
-                    event_result = await r.json()
-                except (
-                    json.decoder.JSONDecodeError,
-                    aiohttp.client_exceptions.ContentTypeError,
-                ) as e:
-                    self.logger.error("Error submitting data: {} {}".format(e, data))
-                    event_result = {
-                        "version": "0.6.0",
-                        "response": {
-                            "message": {
-                                "detection": {
-                                    "name": "index",
-                                    "order": 1,
-                                    "type": 1,
-                                    "version": "0.6.0",
-                                },
-                                "sess_uuid": data["uuid"],
-                            }
-                        },
-                    }
-                finally:
-                    await r.release()
+            try:
+                event_result = await r.json()
+                outcome = "ok"
+            except (
+                json.decoder.JSONDecodeError,
+                aiohttp.client_exceptions.ContentTypeError,
+            ) as e:
+                outcome = "invalid"
+                self.logger.error("Error submitting data: {} {}".format(e, data))
+                event_result = {
+                    "version": "0.6.0",
+                    "response": {
+                        "message": {
+                            "detection": {
+                                "name": "index",
+                                "order": 1,
+                                "type": 1,
+                                "version": "0.6.0",
+                            },
+                            "sess_uuid": data["uuid"],
+                        }
+                    },
+                }
+            finally:
+                await r.release()
         except Exception as e:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure()
             self.logger.exception("Exception: %s", e)
             raise e
+        finally:
+            TANNER_REQUESTS.inc("event", outcome)
+        if self.circuit_breaker is not None:
+            if outcome == "ok":
+                self.circuit_breaker.record_success(time.monotonic() - started)
+            else:
+                self.circuit_breaker.record_failure()
+        return event_result
+
+    @staticmethod
+    def is_cacheable(data):
+        # a body can carry a payload the cached detection knows nothing about, and a client without a
+        # session has to get the sess_uuid that only tanner hands out
+        if data.get("method") not in ("GET", "HEAD") or data.get("post_data"):
+            return False
+        cookies = {key.strip(): value for key, value in (data.get("cookies") or {}).items()}
+        return bool(cookies.get("sess_uuid", "").strip())
+
+    async def get_event_result(self, data):
+        key = None
+        if self.detection_cache is not None and self.is_cacheable(data):
+            key = self.detection_cache.make_key(data["method"], data["path"])
+            detection = self.detection_cache.get(key)
+            if detection is not None:
+                # answer from the cache, tanner still receives and records the event
+                self.event_pipeline.put(data)
+                return {"response": {"message": {"detection": detection}}}
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            return self.local_event_result(data)
+        try:
+            event_result = await self.submit_data(data)
+        except Exception:
+            if self.circuit_breaker is None:
+                raise
+            return self.local_event_result(data)
+        if key is not None:
+            self.detection_cache.put(key, event_result["response"]["message"]["detection"])
         return event_result
 
-    async def parse_tanner_response(self, requested_name, detection):
+    def local_event_result(self, data):
+        # tanner is down or slow: serve the page from meta.json and queue the event until it recovers
+        self.event_pipeline.put(data)
+        return {"response": {"message": {"detection": LOCAL_DETECTION}}}
+
+    async def forward_data(self, data):
+        return await self.submit_data(data)
+
+    async def close(self):
+        await self.event_pipeline.close()
+        await self.html_handler.close()
+
+    def is_static_asset(self, page):
+        return (
+            page.size is not None
+            and page.size > self.sendfile_threshold
+            and not page.content_type.startswith("text/html")
+        )
+
+    def compressed_body(self, content, encoding):
+        # rendered variants are reused, so each one is compressed only once
+        key = (encoding, content)
+        compressed = self.compressed_bodies.get(key)
+        if compressed is None:
+            compressed = compress(content, encoding, fast=True)
+            self.compressed_bodies[key] = compressed
+            while len(self.compressed_bodies) > MAX_COMPRESSED_BODIES:
+                self.compressed_bodies.popitem(last=False)
+        else:
+            self.compressed_bodies.move_to_end(key)
+        return compressed
+
+    async def read_page(self, page, accept_encoding):
+        if page.content_type.startswith("text/html"):
+            with STAGE_DURATION.time("file_read"):
+                content = await self.page_cache.get(page.file_name)
+            if content is None:
+                return None, None
+            with STAGE_DURATION.time("dork_injection"):
+                content = await self.html_handler.handle_content(content)
+            encoding = negotiate_encoding(accept_encoding, available_encodings())
+            if encoding is None or len(content) < MIN_COMPRESS_SIZE:
+                return content, None
+            return self.compressed_body(content, encoding), encoding
+
+        encoding = negotiate_encoding(accept_encoding, page.encodings)
+        with STAGE_DURATION.time("file_read"):
+            if encoding is not None:
+                content = await self.page_cache.get(page.file_name + EXTENSIONS[encoding])
+                if content is not None:
+                    return content, encoding
+            return await self.page_cache.get(page.file_name), None
+
+    def injection_point(self, file_name, content):
+        # byte offset of the closing body tag, found once per page
+        offset = self.injection_points.get(file_name)
+        if offset is None:
+            offset = content.lower().rfind(b"</body>")
+            self.injection_points[file_name] = offset
+        return offset
+
+    @staticmethod
+    def is_not_modified(page, request_headers):
+        if not request_headers or page.etag is None:
+            return False
+        if_none_match = request_headers.get("If-None-Match")
+        if if_none_match is not None:
+            # weak comparison, as required for If-None-Match
+            etag = page.etag[2:] if page.etag.startswith("W/") else page.etag
+            for candidate in if_none_match.split(","):
+                candidate = candidate.strip()
+                if candidate.startswith("W/"):
+                    candidate = candidate[2:]
+                if candidate == "*" or candidate == etag:
+                    return True
+            return False
+        if_modified_since = request_headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            parsed = email.utils.parsedate_tz(if_modified_since)
+            return parsed is not None and page.modified <= email.utils.mktime_tz(parsed)
+        return False
+
+    async def parse_tanner_response(self, requested_name, detection, request_headers=None, method="GET"):
         content = None
         status_code = 200
         headers = multidict.CIMultiDict()
-        # Creating a regex object for the pattern of multiple contiguous forward slashes
-        p = re.compile("/+")
-        # Substituting all occurrences of the pattern with single forward slash
-        requested_name = p.sub("/", requested_name)
+        accept_encoding = request_headers.get("Accept-Encoding") if request_headers else None
 
         if detection["type"] == 1:
-            possible_requests = [requested_name]
-            query_start = requested_name.find("?")
-            if query_start != -1:
-                possible_requests.append(requested_name[:query_start])
-
-            file_name = None
-            for requested_name in possible_requests:
-                if requested_name == "/":
-                    requested_name = self.run_args.index_page
-                if requested_name[-1] == "/":
-                    requested_name = requested_name[:-1]
-                requested_name = unquote(requested_name)
-                try:
-                    file_name = self.meta[requested_name]["hash"]
-                    for header in self.meta[requested_name].get("headers", []):
-                        for key, value in header.items():
-                            headers.add(key, value)
-                    # overwrite headers with legacy content-type if present and not none
-                    content_type = self.meta[requested_name].get("content_type")
-                    if content_type:
-                        headers["Content-Type"] = content_type
-                except KeyError:
-                    pass
-                else:
-                    break
-
-            if not file_name:
+            page = self.path_resolver.resolve(requested_name)
+            if page is None:
                 status_code = 404
+            elif method in ("GET", "HEAD") and self.is_not_modified(page, request_headers):
+                status_code = 304
+                headers.extend(page.headers)
+                headers["ETag"] = page.etag
+                headers["Last-Modified"] = page.last_modified
+            elif self.is_static_asset(page):
+                # large static files are streamed from disk by the server
+                headers.extend(page.headers)
+                headers["ETag"] = page.etag
+                content = pathlib.Path(self.dir, page.file_name)
             else:
-                path = os.path.join(self.dir, file_name)
-                if os.path.isfile(path):
-                    with open(path, "rb") as fh:
-                        content = fh.read()
-                    if headers.get("Content-Type", "").startswith("text/html"):
-                        content = await self.html_handler.handle_content(content)
+                headers.extend(page.headers)
+                if page.etag is not None:
+                    headers["ETag"] = page.etag
+                    headers["Last-Modified"] = page.last_modified
+                content, encoding = await self.read_page(page, accept_encoding)
+                if encoding is not None:
+                    headers["Content-Encoding"] = encoding
+                if is_compressible(page.content_type):
+                    headers["Vary"] = "Accept-Encoding"
 
         elif detection["type"] == 2:
             payload_content = detection["payload"]
             if payload_content["page"]:
-                try:
-                    file_name = self.meta[payload_content["page"]]["hash"]
-                    for header in self.meta[payload_content["page"]].get("headers", []):
-                        for key, value in header.items():
-                            headers.add(key, value)
-                    # overwrite headers with legacy content-type if present and not none
-                    content_type = self.meta[payload_content["page"]].get("content_type")
-                    if content_type:
-                        headers["Content-Type"] = content_type
-                    page_path = os.path.join(self.dir, file_name)
-                    with open(page_path, encoding="utf-8") as p:
-                        content = p.read()
-                except KeyError:
-                    content = "<html><body></body></html>"
+                page = self.path_resolver.lookup(payload_content["page"])
+                if page is not None:
+                    headers.extend(page.headers)
+                    with STAGE_DURATION.time("file_read"):
+                        content = await self.page_cache.get(page.file_name)
+                if content is None:
+                    content = EMPTY_PAGE
+                    offset = EMPTY_PAGE.rfind(b"</body>")
                     headers["Content-Type"] = "text/html"
+                else:
+                    offset = self.injection_point(page.file_name, content)
 
-                soup = BeautifulSoup(content, "html.parser")
-                script_tag = soup.new_tag("div")
-                script_tag.append(BeautifulSoup(payload_content["value"], "html.parser"))
-                soup.body.append(script_tag)
-                content = str(soup).encode()
+                with STAGE_DURATION.time("payload_injection"):
+                    if offset != -1:
+                        content = b"".join(
+                            (
+                                content[:offset],
+                                b"<div>",
+                                payload_content["value"].encode("utf-8"),
+                                b"</div>",
+                                content[offset:],
+                            )
+                        )
+                    else:
+                        # no closing body tag to splice at, let the parser fix up the page
+                        soup = parse_html(content.decode("utf-8"), self.parser)
+                        script_tag = soup.new_tag("div")
+                        script_tag.append(parse_fragment(payload_content["value"]))
+                        (soup.body or soup).append(script_tag)
+                        content = str(soup).encode()
             else:
                 content_type = "text/plain"
                 if content_type:
@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import patch
+from snare.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, slow_call_threshold=1.0, reset_timeout=10)
+
+    def test_opens_after_failures(self):
+        with patch("time.monotonic", return_value=100):
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, CLOSED)
+            with self.assertLogs("snare.circuit_breaker", level="ERROR"):
+                self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, OPEN)
+            self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+        self.assertEqual(self.breaker.stats()["opened"], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        self.breaker.record_success(0.5)
+        self.assertEqual(self.breaker.failures, 0)
+        self.breaker.record_success(1.5)
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_probe(self):
+        with patch("time.monotonic", return_value=100), self.assertLogs("snare.circuit_breaker", level="ERROR"):
+            self.breaker.trip()
+        with patch("time.monotonic", return_value=110):
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            self.assertTrue(self.breaker.allow())
+            self.assertFalse(self.breaker.allow())
+            with self.assertLogs("snare.circuit_breaker", level="INFO"):
+                self.breaker.record_success(0.1)
+            self.assertEqual(self.breaker.state, CLOSED)
+            self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        with patch("time.monotonic", return_value=100), self.assertLogs("snare.circuit_breaker", level="ERROR"):
+            self.breaker.trip()
+        with patch("time.monotonic", return_value=110), self.assertLogs("snare.circuit_breaker", level="ERROR"):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.stats()["opened"], 2)
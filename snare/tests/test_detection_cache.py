@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import patch
+from snare.detection_cache import DetectionCache
+
+
+class TestDetectionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = DetectionCache(ttl=10, max_entries=2)
+        self.detection = {"name": "index", "order": 1, "type": 1}
+
+    def test_make_key(self):
+        self.assertEqual(DetectionCache.make_key("GET", "//a//b/?x=1"), ("GET", "/a/b", "x=1"))
+        self.assertEqual(DetectionCache.make_key("GET", "/"), ("GET", "/", ""))
+
+    def test_hit_and_miss(self):
+        key = DetectionCache.make_key("GET", "/index.html")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self.detection)
+        self.assertEqual(self.cache.get(key), self.detection)
+        self.assertEqual(self.cache.stats()["hit_rate"], 0.5)
+
+    def test_only_type_one_cached(self):
+        key = DetectionCache.make_key("GET", "/?id=1'")
+        self.cache.put(key, {"type": 2, "payload": {}})
+        self.assertIsNone(self.cache.get(key))
+
+    def test_expiry(self):
+        key = DetectionCache.make_key("GET", "/index.html")
+        with patch("time.monotonic", return_value=100):
+            self.cache.put(key, self.detection)
+        with patch("time.monotonic", return_value=111):
+            self.assertIsNone(self.cache.get(key))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_max_entries(self):
+        for path in ["/a", "/b", "/c"]:
+            self.cache.put(DetectionCache.make_key("GET", path), self.detection)
+        self.assertIsNone(self.cache.get(DetectionCache.make_key("GET", "/a")))
+        self.assertEqual(len(self.cache.entries), 2)
@@ -0,0 +1,94 @@
+import unittest
+import asyncio
+from unittest.mock import patch
+from snare.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN
+from snare.utils.asyncmock import AsyncMock
+from snare.event_pipeline import EventPipeline
+
+
+class TestEventPipeline(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.send = AsyncMock()
+        self.pipeline = EventPipeline(self.send, max_size=3, batch_size=2, batch_age=0.01)
+
+    def test_events_are_sent_in_batches(self):
+        async def test():
+            for i in range(3):
+                self.pipeline.put({"path": "/{}".format(i)})
+            await self.pipeline.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.pipeline.stats()["sent"], 3)
+        self.assertEqual(self.pipeline.stats()["batches"], 2)
+
+    def test_drop_oldest(self):
+        async def test():
+            for i in range(5):
+                self.pipeline.put({"path": "/{}".format(i)})
+            await self.pipeline.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.pipeline.dropped, 2)
+        self.assertEqual(self.pipeline.high_watermark, 3)
+        self.send.assert_called_with({"path": "/4"})
+
+    def test_drop_newest(self):
+        self.pipeline.policy = "drop-newest"
+
+        async def test():
+            for i in range(5):
+                self.pipeline.put({"path": "/{}".format(i)})
+            await self.pipeline.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.pipeline.dropped, 2)
+        self.send.assert_called_with({"path": "/2"})
+
+    def test_failed_events(self):
+        self.send.side_effect = Exception()
+
+        async def test():
+            self.pipeline.put({"path": "/"})
+            await self.pipeline.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.pipeline.failed, 1)
+        self.assertEqual(self.pipeline.sent, 0)
+
+    def test_half_open_sends_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        with patch("time.monotonic", return_value=100), self.assertLogs("snare.circuit_breaker", level="ERROR"):
+            breaker.trip()
+        in_flight = []
+        sends = []
+
+        async def send(data):
+            in_flight.append(data)
+            sends.append((breaker.state, len(in_flight)))
+            await asyncio.sleep(0)
+            breaker.record_success(0.1)
+            in_flight.remove(data)
+
+        pipeline = EventPipeline(send, max_size=10, batch_size=5, batch_age=0.01, circuit_breaker=breaker)
+
+        async def test():
+            for i in range(5):
+                pipeline.put({"path": "/{}".format(i)})
+            await pipeline.close()
+
+        with patch("time.monotonic", return_value=110), self.assertLogs("snare.circuit_breaker", level="INFO"):
+            self.loop.run_until_complete(test())
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(pipeline.sent, 5)
+        # one probe while half-open, the rest of the batch once the circuit closed
+        self.assertEqual(sends[0], (HALF_OPEN, 1))
+        self.assertTrue(all(state == CLOSED for state, _ in sends[1:]))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            EventPipeline(self.send, policy="spill")
+
+    def tearDown(self):
+        self.loop.close()
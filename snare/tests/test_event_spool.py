@@ -0,0 +1,188 @@
+import unittest
+import asyncio
+import glob
+import os
+import shutil
+from unittest import mock
+from snare.utils.asyncmock import AsyncMock
+from snare.event_pipeline import EventPipeline
+from snare.event_spool import EventSpool
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestEventSpool(unittest.TestCase):
+    def setUp(self):
+        self.spool_dir = generate_unique_path()
+        self.spool = EventSpool(self.spool_dir, max_size=1024, segment_size=100, replay_rate=1000, fsync_batch=2)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.send = AsyncMock()
+
+    @staticmethod
+    def event(index):
+        # 34 bytes spooled
+        return {"path": "/{}".format(index), "data": "x" * 10}
+
+    def segments(self, directory="0"):
+        return sorted(glob.glob(os.path.join(self.spool_dir, directory, "events-*.jsonl")))
+
+    def test_append_rotates_segments(self):
+        async def test():
+            for i in range(6):
+                self.spool.append(self.event(i))
+            await self.spool.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual(self.spool.stats()["spooled"], 6)
+        self.assertGreaterEqual(self.spool.fsyncs, 3)
+
+    def test_max_size(self):
+        self.spool.max_size = 80
+
+        async def test():
+            for i in range(3):
+                self.spool.append(self.event(i))
+            await self.spool.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.spool.spooled, 2)
+        self.assertEqual(self.spool.dropped, 1)
+
+    def test_replay_after_restart(self):
+        async def write():
+            for i in range(6):
+                self.spool.append(self.event(i))
+            await self.spool.close()
+
+        async def replay():
+            spool = EventSpool(self.spool_dir, replay_rate=1000)
+            spool.start(self.send)
+            await asyncio.sleep(0.1)
+            await spool.close()
+            return spool
+
+        self.loop.run_until_complete(write())
+        with self.assertLogs("snare.event_spool", level="INFO"):
+            spool = self.loop.run_until_complete(replay())
+        self.assertEqual(self.send.call_count, 6)
+        self.assertEqual(spool.stats()["replayed"], 6)
+        self.assertEqual(spool.size, 0)
+        self.assertEqual(self.segments(), [])
+
+    def test_failed_replay_stays_in_segment(self):
+        send = AsyncMock(side_effect=[OSError(), None, None])
+
+        async def test():
+            self.spool.append({"path": "/a"})
+            self.spool.append({"path": "/b"})
+            self.spool.start(send)
+            await asyncio.sleep(0.2)
+            await self.spool.close()
+
+        with mock.patch("snare.event_spool.RETRY_INTERVAL", 0.01), mock.patch(
+            "snare.event_spool.REPLAY_CHECK_INTERVAL", 0.01
+        ):
+            self.loop.run_until_complete(test())
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(self.spool.spooled, 2)
+        self.assertEqual(self.spool.replayed, 2)
+        self.assertEqual(self.segments(), [])
+
+    def test_failed_write_not_replayed(self):
+        async def test():
+            with mock.patch.object(self.spool, "write_lines", side_effect=OSError("read-only")):
+                for i in range(3):
+                    self.spool.append(self.event(i))
+                await asyncio.wait(self.spool.writes)
+            self.assertEqual(self.spool.segments, [])
+            self.assertEqual(self.spool.size, 0)
+            await self.spool.close()
+
+        with self.assertLogs("snare.event_spool", level="ERROR"):
+            self.loop.run_until_complete(test())
+
+    def test_replay_skips_missing_segment(self):
+        async def test():
+            for i in range(3):
+                self.spool.append(self.event(i))
+            await asyncio.wait(self.spool.writes)
+            missing = os.path.join(self.spool.path, "events-missing.jsonl")
+            self.spool.segments.insert(0, missing)
+            self.spool.segment_sizes[missing] = 10
+            self.spool.size += 10
+            self.spool.start(self.send)
+            await asyncio.sleep(0.1)
+            await self.spool.close()
+
+        with self.assertLogs("snare.event_spool", level="ERROR"):
+            self.loop.run_until_complete(test())
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual(self.spool.size, 0)
+
+    def test_writes_off_the_loop(self):
+        async def test():
+            self.spool.append(self.event(0))
+            # buffered until the fsync batch is full or the interval passed
+            self.assertEqual(self.spool.fsyncs, 0)
+            self.spool.append(self.event(1))
+            await asyncio.wait(self.spool.writes)
+            self.assertEqual(self.spool.fsyncs, 1)
+            await self.spool.close()
+
+        self.loop.run_until_complete(test())
+        with open(self.segments()[0]) as segment:
+            self.assertEqual(len(segment.readlines()), 2)
+
+    def test_no_replay_while_paused(self):
+        async def test():
+            self.spool.start(self.send, paused=lambda: True)
+            self.spool.append({"path": "/"})
+            await asyncio.sleep(0.05)
+            await self.spool.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.send.call_count, 0)
+        self.assertEqual(len(self.segments()), 1)
+
+    def test_workers_use_separate_directories(self):
+        other = EventSpool(self.spool_dir)
+        self.spool.open()
+        other.open()
+        self.assertNotEqual(self.spool.path, other.path)
+        self.loop.run_until_complete(other.close())
+        self.loop.run_until_complete(self.spool.close())
+
+    def test_pipeline_spools_failed_events(self):
+        send = AsyncMock(side_effect=OSError())
+        self.spool.replay_rate = 0.001
+        pipeline = EventPipeline(send, max_size=10, batch_size=2, batch_age=0.01, spool=self.spool)
+
+        async def test():
+            pipeline.put({"path": "/a"})
+            pipeline.put({"path": "/b"})
+            await asyncio.sleep(0.05)
+            await pipeline.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(pipeline.failed, 2)
+        self.assertEqual(self.spool.spooled, 2)
+
+    def test_pipeline_spools_overflow(self):
+        pipeline = EventPipeline(self.send, max_size=1, spool=self.spool, paused=lambda: True)
+
+        async def test():
+            for i in range(3):
+                pipeline.put({"path": "/{}".format(i)})
+            await pipeline.close()
+
+        with self.assertLogs("snare.event_pipeline", level="INFO"):
+            self.loop.run_until_complete(test())
+        self.assertEqual(pipeline.dropped, 0)
+        self.assertEqual(self.spool.spooled, 3)
+        self.assertEqual(self.send.call_count, 0)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
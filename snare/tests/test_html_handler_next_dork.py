@@ -0,0 +1,68 @@
+import unittest
+import asyncio
+import json
+import shutil
+import os
+from snare.utils.asyncmock import AsyncMock
+from snare.html_handler import HtmlHandler
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestNextDork(unittest.TestCase):
+    def setUp(self):
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        self.dorks_file = os.path.join(self.main_page_path, "dorks.json")
+        self.loop = asyncio.new_event_loop()
+        self.handler = HtmlHandler(
+            False,
+            "tanner.mushmush.org",
+            dorks_low_watermark=2,
+            dorks_high_watermark=4,
+            dorks_file=self.dorks_file,
+        )
+        self.handler.get_dorks = AsyncMock(side_effect=lambda: ["/dork1", "/dork2"])
+        self.dork = None
+
+    def test_refill_up_to_high_watermark(self):
+        async def test():
+            await self.handler.start_refill()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(len(self.handler.dorks), 4)
+        self.assertEqual(self.handler.get_dorks.call_count, 2)
+        with open(self.dorks_file) as f:
+            self.assertEqual(json.load(f), ["/dork1", "/dork2"])
+
+    def test_refill_below_low_watermark(self):
+        self.handler.dorks = ["/dork3", "/dork4"]
+
+        async def test():
+            self.dork = await self.handler.next_dork()
+            await self.handler.refill_task
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.dork, "/dork4")
+        self.assertEqual(self.handler.dorks, ["/dork3", "/dork1", "/dork2", "/dork1", "/dork2"])
+
+    def test_recycled_dorks_do_not_block(self):
+        self.handler.recycled_dorks.extend(["/old_dork"])
+        self.handler.get_dorks = AsyncMock(return_value=[])
+
+        async def test():
+            self.dork = await self.handler.next_dork()
+            self.assertFalse(self.handler.get_dorks.called)
+            await self.handler.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.dork, "/old_dork")
+
+    def test_load_saved_dorks(self):
+        with open(self.dorks_file, "w") as f:
+            json.dump(["/saved1", "/saved2"], f)
+        self.handler.load_dorks()
+        self.assertEqual(list(self.handler.recycled_dorks), ["/saved1", "/saved2"])
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.main_page_path)
@@ -0,0 +1,74 @@
+import unittest
+import asyncio
+import itertools
+from unittest.mock import Mock
+from snare.utils.asyncmock import AsyncMock
+from snare.html_handler import HtmlHandler
+
+
+class TestHtmlHandlerVariants(unittest.TestCase):
+    def setUp(self):
+        self.content = b'<html><body><p style="color:red;">A paragraph to be tested</p></body></html>'
+        self.loop = asyncio.new_event_loop()
+        self.handler = HtmlHandler(False, "tanner.mushmush.org", dork_variants=3)
+        counter = itertools.count()
+        self.handler.get_dorks = AsyncMock(side_effect=lambda: ["dork{}".format(next(counter))])
+        self.results = []
+
+    def test_variants_rotate(self):
+        async def test():
+            for _ in range(6):
+                self.results.append(await self.handler.handle_content(self.content))
+                # variants are rendered in the executor
+                await asyncio.gather(*self.handler.refresh_tasks)
+            await self.handler.close()
+
+        self.loop.run_until_complete(test())
+        pool = self.handler.variants[self.content]
+        self.assertEqual(len(pool.variants), 3)
+        self.assertEqual(pool.served, 6)
+        self.assertGreaterEqual(len(set(self.results)), 3)
+        self.assertEqual(pool.served % 3, 0)
+
+    def test_no_dorks_single_variant(self):
+        self.handler.no_dorks = True
+
+        async def test():
+            for _ in range(3):
+                self.results.append(await self.handler.handle_content(self.content))
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(len(self.handler.variants[self.content].variants), 1)
+        self.assertEqual(len(self.handler.refresh_tasks), 0)
+        self.assertIs(self.results[0], self.results[2])
+
+    def test_render_error_in_background(self):
+        async def test():
+            await self.handler.handle_content(self.content)
+            self.handler.take_dork = Mock(side_effect=IndexError())
+            with self.assertLogs("snare.html_handler", level="ERROR") as log:
+                await asyncio.gather(*self.handler.refresh_tasks)
+            self.assertIn("Error rendering page variant", log.output[0])
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(len(self.handler.variants[self.content].variants), 1)
+        self.assertFalse(self.handler.variants[self.content].refreshing)
+
+    def test_cache_size_bound(self):
+        self.handler.no_dorks = True
+        self.handler.variant_cache_size = 3 * len(self.content)
+        pages = [self.content.replace(b"tested", "tested {}".format(i).encode()) for i in range(4)]
+
+        async def test():
+            for page in pages:
+                await self.handler.handle_content(page)
+
+        self.loop.run_until_complete(test())
+        self.assertLessEqual(self.handler.variants_size, self.handler.variant_cache_size)
+        self.assertNotIn(pages[0], self.handler.variants)
+        self.assertIn(pages[-1], self.handler.variants)
+        sizes = sum(len(page) + pool.size for page, pool in self.handler.variants.items())
+        self.assertEqual(self.handler.variants_size, sizes)
+
+    def tearDown(self):
+        self.loop.close()
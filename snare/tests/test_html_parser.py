@@ -0,0 +1,32 @@
+import unittest
+from unittest import mock
+from snare.utils import html_parser
+from snare.utils.html_parser import available_parsers, parse_fragment, parse_html, select_parser
+
+
+class TestHtmlParser(unittest.TestCase):
+    def test_html_parser_always_available(self):
+        self.assertIn("html.parser", available_parsers())
+
+    def test_default(self):
+        self.assertEqual(select_parser(None), "html.parser")
+        self.assertEqual(select_parser("html.parser"), "html.parser")
+
+    def test_auto_picks_fastest_installed(self):
+        self.assertEqual(select_parser("auto"), available_parsers()[0])
+
+    def test_fallback_when_missing(self):
+        with mock.patch.object(html_parser, "available_parsers", return_value=["html.parser"]):
+            with self.assertLogs(level="WARNING"):
+                self.assertEqual(select_parser("lxml"), "html.parser")
+
+    def test_unknown_parser(self):
+        with self.assertRaises(ValueError):
+            select_parser("regex")
+
+    def test_fragment_is_not_wrapped(self):
+        self.assertEqual(str(parse_fragment("<b>x</b>")), "<b>x</b>")
+
+    def test_parse_html(self):
+        soup = parse_html("<html><body><p>a</p></body></html>")
+        self.assertEqual(soup.p.string, "a")
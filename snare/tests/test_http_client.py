@@ -0,0 +1,39 @@
+import unittest
+import asyncio
+from snare.http_client import HttpClient
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.client = HttpClient(pool_size=10, pool_size_per_host=2)
+        self.loop = asyncio.new_event_loop()
+
+    def test_session_is_shared(self):
+        async def test():
+            self.assertIs(self.client.session, self.client.session)
+            await self.client.close()
+
+        self.loop.run_until_complete(test())
+
+    def test_connector_limits(self):
+        async def test():
+            connector = self.client.session.connector
+            self.assertEqual(connector.limit, 10)
+            self.assertEqual(connector.limit_per_host, 2)
+            self.assertTrue(connector.use_dns_cache)
+            await self.client.close()
+
+        self.loop.run_until_complete(test())
+
+    def test_close(self):
+        async def test():
+            session = self.client.session
+            await self.client.close()
+            self.assertTrue(session.closed)
+            self.assertIsNot(self.client.session, session)
+            await self.client.close()
+
+        self.loop.run_until_complete(test())
+
+    def tearDown(self):
+        self.loop.close()
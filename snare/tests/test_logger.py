@@ -1,7 +1,13 @@
 import unittest
-from snare.utils.logger import Logger, LevelFilter
+from snare.utils.logger import Logger, LevelFilter, DroppingQueueHandler, CompressingRotatingFileHandler
+import glob
+import gzip
+import json
 import logging
 import os
+import queue
+import shutil
+from snare.utils.page_path_generator import generate_unique_path
 
 
 class TestLogger(unittest.TestCase):
@@ -21,6 +27,67 @@ class TestLogger(unittest.TestCase):
     def test_filter(self):
         self.assertTrue(LevelFilter(logging.ERROR).filter(logging.makeLogRecord(self.record_dict)))
 
+    def test_queued_logger(self):
+        logger = Logger.create_logger(self.snare_log_file, self.snare_err_log_file, "queued", queue_size=10)
+        logger.info("info message")
+        logger.error("error message")
+        Logger.stop_listeners()
+        with open(self.snare_log_file) as log:
+            self.assertIn("info message", log.read())
+        with open(self.snare_err_log_file) as err:
+            content = err.read()
+        self.assertIn("error message", content)
+        self.assertNotIn("info message", content)
+
+    def test_remove_handlers(self):
+        logger = Logger.create_logger(self.snare_log_file, self.snare_err_log_file, "worker", queue_size=10)
+        Logger.remove_handlers()
+        self.assertEqual(logger.handlers, [])
+        self.assertEqual(Logger.listeners, [])
+
+    def test_queue_full(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        handler.handle(logging.makeLogRecord(self.record_dict))
+        handler.handle(logging.makeLogRecord(self.record_dict))
+        self.assertEqual(handler.dropped, 1)
+
+    def test_request_logger(self):
+        log_dir = generate_unique_path()
+        os.makedirs(log_dir)
+        request_log = os.path.join(log_dir, "requests.jsonl")
+        try:
+            logger = Logger.create_request_logger(request_log, "requests")
+            logger.info({"path": "/index.html", "status": 200})
+            for handler in logger.handlers:
+                handler.flush()
+            with open(request_log) as log:
+                event = json.loads(log.readline())
+            self.assertEqual(event["path"], "/index.html")
+            self.assertEqual(event["status"], 200)
+            self.assertIn("time", event)
+        finally:
+            for handler in list(logging.getLogger("requests").handlers):
+                handler.close()
+                logging.getLogger("requests").removeHandler(handler)
+            shutil.rmtree(log_dir)
+
+    def test_rotation(self):
+        log_dir = generate_unique_path()
+        os.makedirs(log_dir)
+        log_file = os.path.join(log_dir, "snare.log")
+        handler = CompressingRotatingFileHandler(log_file, max_bytes=100, backup_count=2)
+        try:
+            for index in range(20):
+                handler.emit(logging.makeLogRecord({"msg": "message {:040d}".format(index)}))
+            handler.close()
+            segments = glob.glob(log_file + ".*.gz")
+            self.assertEqual(len(segments), 2)
+            with gzip.open(segments[0], "rt") as segment:
+                self.assertIn("message", segment.read())
+            self.assertEqual(glob.glob(log_file + ".*[0-9]"), [])
+        finally:
+            shutil.rmtree(log_dir)
+
     def tearDown(self):
         try:
             os.remove(self.cloner_log_file)
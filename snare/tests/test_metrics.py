@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from snare.metrics import REQUESTS, Registry
+from snare.middlewares import create_metrics_middleware
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.loop = asyncio.new_event_loop()
+
+    def test_counter(self):
+        counter = self.registry.counter("test_total", "test counter", ["outcome"])
+        counter.inc("ok")
+        counter.inc("ok", amount=2)
+        counter.inc("error")
+        self.assertEqual(counter.get("ok"), 3)
+        output = self.registry.render()
+        self.assertIn("# TYPE test_total counter", output)
+        self.assertIn('test_total{outcome="ok"} 3', output)
+        self.assertIn('test_total{outcome="error"} 1', output)
+
+    def test_register_twice(self):
+        counter = self.registry.counter("test_total", "test counter")
+        self.assertIs(self.registry.counter("test_total", "test counter"), counter)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("test_seconds", "test histogram", ["stage"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, "tanner")
+        histogram.observe(0.5, "tanner")
+        histogram.observe(5, "tanner")
+        output = self.registry.render()
+        self.assertIn('test_seconds_bucket{stage="tanner",le="0.1"} 1', output)
+        self.assertIn('test_seconds_bucket{stage="tanner",le="1.0"} 2', output)
+        self.assertIn('test_seconds_bucket{stage="tanner",le="+Inf"} 3', output)
+        self.assertIn('test_seconds_count{stage="tanner"} 3', output)
+        self.assertIn('test_seconds_sum{stage="tanner"} 5.55', output)
+
+    def test_timer(self):
+        histogram = self.registry.histogram("test_seconds", "test histogram")
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count(), 1)
+
+    def test_collector(self):
+        self.registry.add_collector("test_cache", lambda: dict(hits=2, enabled=True, name="x"))
+        output = self.registry.render()
+        self.assertIn("test_cache_hits 2", output)
+        self.assertNotIn("test_cache_enabled", output)
+        self.assertNotIn("test_cache_name", output)
+
+    def test_metrics_middleware(self):
+        async def handler(request):
+            raise web.HTTPNotFound()
+
+        before = REQUESTS.get("GET", "404")
+        middleware = create_metrics_middleware()
+        with self.assertRaises(web.HTTPNotFound):
+            self.loop.run_until_complete(middleware(make_mocked_request("GET", "/missing"), handler))
+        self.assertEqual(REQUESTS.get("GET", "404"), before + 1)
+
+    def test_metrics_middleware_other_method(self):
+        async def handler(request):
+            return web.Response()
+
+        before = REQUESTS.get("other", "200")
+        middleware = create_metrics_middleware()
+        self.loop.run_until_complete(middleware(make_mocked_request("RANDOMVERB", "/"), handler))
+        self.assertEqual(REQUESTS.get("other", "200"), before + 1)
+        self.assertEqual(REQUESTS.get("RANDOMVERB", "200"), 0)
+
+    def tearDown(self):
+        self.loop.close()
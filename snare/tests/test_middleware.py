@@ -1,14 +1,62 @@
 import unittest
+import asyncio
+import shutil
+import os
+import aiohttp_jinja2
+import jinja2
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
 from snare.middlewares import SnareMiddleware
+from snare.utils.page_path_generator import generate_unique_path
 
 
 class TestMiddleware(unittest.TestCase):
     def setUp(self):
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        with open(os.path.join(self.main_page_path, "error_404.html"), "w") as f:
+            f.write("<html>not found</html>")
         self.middleware = SnareMiddleware(
             "error_404.html",
             headers=[{"Content-Type": "text/html; charset=UTF-8"}],
             server_header="nginx",
         )
+        self.loop = asyncio.new_event_loop()
+        app = web.Application()
+        aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(self.main_page_path))
+        self.request = make_mocked_request("GET", "/missing", app=app)
+        self.response = None
 
     def test_initialization(self):
         self.assertIsInstance(self.middleware, SnareMiddleware)
+
+    def test_handle_404(self):
+        async def test():
+            self.response = await self.middleware.handle_404(self.request)
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.response.status, 404)
+        self.assertEqual(self.response.body, b"<html>not found</html>")
+        self.assertEqual(self.response.headers["Server"], "nginx")
+        self.assertEqual(self.response.headers["Content-Type"], "text/html; charset=UTF-8")
+
+    def test_error_page_is_rendered_once(self):
+        page = self.middleware.render_error_page(self.request, "error_404.html")
+        self.assertIs(self.middleware.render_error_page(self.request, "error_404.html"), page)
+        page.checked = 0
+        self.assertIs(self.middleware.render_error_page(self.request, "error_404.html"), page)
+
+    def test_error_page_rerendered_on_change(self):
+        page = self.middleware.render_error_page(self.request, "error_404.html")
+        template_path = os.path.join(self.main_page_path, "error_404.html")
+        with open(template_path, "w") as f:
+            f.write("<html>changed</html>")
+        os.utime(template_path, (0, os.path.getmtime(template_path) + 10))
+        page.checked = 0
+        self.assertEqual(
+            self.middleware.render_error_page(self.request, "error_404.html").body, b"<html>changed</html>"
+        )
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.main_page_path)
@@ -0,0 +1,61 @@
+import unittest
+import asyncio
+import shutil
+import os
+from snare.page_cache import PageCache
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        self.meta = {
+            "/index.html": {"hash": "hash_index"},
+            "/about.html": {"hash": "hash_about"},
+        }
+        with open(os.path.join(self.main_page_path, "hash_index"), "wb") as f:
+            f.write(b"0123456789")
+        with open(os.path.join(self.main_page_path, "hash_about"), "wb") as f:
+            f.write(b"abcdefghij")
+        self.cache = PageCache(self.main_page_path, 15)
+        self.loop = asyncio.new_event_loop()
+        self.content = None
+
+    def test_get_miss_then_hit(self):
+        async def test():
+            await self.cache.get("hash_index")
+            self.content = await self.cache.get("hash_index")
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.content, b"0123456789")
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_get_missing_file(self):
+        async def test():
+            self.content = await self.cache.get("missing")
+
+        self.loop.run_until_complete(test())
+        self.assertIsNone(self.content)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_byte_based_eviction(self):
+        async def test():
+            await self.cache.get("hash_index")
+            await self.cache.get("hash_about")
+
+        self.loop.run_until_complete(test())
+        self.assertNotIn("hash_index", self.cache.pages)
+        self.assertIn("hash_about", self.cache.pages)
+        self.assertEqual(self.cache.size, 10)
+
+    def test_preload(self):
+        self.cache.max_size = 20
+        self.cache.preload(self.meta)
+        self.assertEqual(self.cache.size, 20)
+        self.assertEqual(self.cache.misses, 0)
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.main_page_path)
@@ -0,0 +1,68 @@
+import unittest
+import hashlib
+import shutil
+import os
+import multidict
+from snare.path_resolver import PathResolver
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestPathResolver(unittest.TestCase):
+    def setUp(self):
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        self.meta = {
+            "/index.html": {
+                "hash": "hash_index",
+                "headers": [
+                    {"Content-Type": "text/html"},
+                    {"Set-Cookie": "a=1"},
+                    {"Set-Cookie": "b=2"},
+                    {"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+                ],
+            },
+            "/docs/a b.css": {
+                "hash": "hash_css",
+                "content_type": "text/css",
+            },
+        }
+        with open(os.path.join(self.main_page_path, "hash_index"), "w") as f:
+            f.write("<html></html>")
+        self.resolver = PathResolver(self.meta, self.main_page_path, "/index.html")
+
+    def test_descriptor(self):
+        page = self.resolver.resolve("/index.html")
+        self.assertEqual(page.file_name, "hash_index")
+        self.assertEqual(page.content_type, "text/html")
+        self.assertEqual(page.size, 13)
+        self.assertEqual(page.headers.getall("Set-Cookie"), ["a=1", "b=2"])
+        self.assertIsInstance(page.headers, multidict.CIMultiDictProxy)
+
+    def test_validators(self):
+        page = self.resolver.resolve("/index.html")
+        self.assertEqual(page.etag, 'W/"{}"'.format(hashlib.md5(b"<html></html>").hexdigest()))
+        self.assertEqual(page.last_modified, "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.assertEqual(page.modified, 1445412480)
+        self.assertIsNone(self.resolver.resolve("/docs/a b.css").etag)
+
+    def test_index_alias(self):
+        self.assertIs(self.resolver.resolve("/"), self.resolver.resolve("/index.html"))
+        self.assertIs(self.resolver.resolve("//?a=b"), self.resolver.resolve("/index.html"))
+
+    def test_normalization(self):
+        page = self.resolver.resolve("//docs//a%20b.css/?v=1")
+        self.assertEqual(page.file_name, "hash_css")
+        self.assertEqual(page.content_type, "text/css")
+        self.assertIsNone(page.size)
+
+    def test_unknown_path(self):
+        self.assertIsNone(self.resolver.resolve("/something/"))
+        self.assertIsNone(self.resolver.resolve("?"))
+
+    def test_resolve_is_cached(self):
+        self.resolver.resolve("/index.html?a=b")
+        self.resolver.resolve("/index.html?a=b")
+        self.assertEqual(self.resolver.resolve.cache_info().hits, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.main_page_path)
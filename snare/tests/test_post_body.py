@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from snare.post_body import PostBodyReader, TRUNCATED_MARKER, prune_uploads
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestPostBodyReader(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = generate_unique_path()
+        self.reader = PostBodyReader(max_size=100, upload_dir=self.upload_dir, upload_max_size=1000)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bodies = []
+
+    def post(self, **kwargs):
+        async def handler(request):
+            self.bodies.append(await self.reader.read(request))
+            return web.Response(text="ok")
+
+        async def test():
+            app = web.Application()
+            app.router.add_post("/", handler)
+            client = TestClient(TestServer(app))
+            await client.start_server()
+            try:
+                response = await client.post("/", **kwargs)
+                await response.release()
+            finally:
+                await client.close()
+
+        self.loop.run_until_complete(test())
+        return self.bodies[0]
+
+    def test_urlencoded(self):
+        body = self.post(data={"user": "admin", "pass": "' or 1=1"})
+        self.assertEqual(body.fields, {"user": "admin", "pass": "' or 1=1"})
+        self.assertFalse(body.truncated)
+
+    def test_urlencoded_truncated(self):
+        body = self.post(data={"a": "1", "b": "x" * 500})
+        self.assertTrue(body.truncated)
+        self.assertEqual(body.size, len("a=1&b=") + 500)
+        self.assertTrue(body.fields["b"].endswith(TRUNCATED_MARKER))
+        self.assertEqual(body.fields["a"], "1")
+
+    def test_multipart_upload(self):
+        content = os.urandom(300)
+        form = aiohttp.FormData()
+        form.add_field("name", "shell")
+        form.add_field("file", content, filename="shell.php", content_type="application/x-php")
+        body = self.post(data=form)
+        self.assertEqual(body.fields, {"name": "shell", "file": "shell.php"})
+        upload = body.uploads[0]
+        self.assertEqual(upload["size"], 300)
+        self.assertEqual(upload["sha256"], hashlib.sha256(content).hexdigest())
+        self.assertEqual(upload["content_type"], "application/x-php")
+        with open(upload["path"], "rb") as stored:
+            self.assertEqual(stored.read(), content)
+        data = {}
+        body.add_to_event(data)
+        self.assertNotIn("path", data["post_uploads"][0])
+        self.assertNotIn("post_truncated", data)
+
+    def test_large_upload_is_capped(self):
+        content = os.urandom(5000)
+        form = aiohttp.FormData()
+        form.add_field("file", content, filename="big.bin")
+        body = self.post(data=form)
+        upload = body.uploads[0]
+        self.assertEqual(upload["stored"], 1000)
+        self.assertEqual(upload["sha256"], hashlib.sha256(content[:1000]).hexdigest())
+        self.assertTrue(body.truncated)
+        self.assertLessEqual(body.size, 1100 + 8192)
+        self.assertEqual(os.path.getsize(upload["path"]), 1000)
+
+    def test_upload_dir_max_size(self):
+        self.reader.upload_dir_max_size = 1500
+        for i in range(3):
+            form = aiohttp.FormData()
+            form.add_field("file", os.urandom(600), filename="{}.bin".format(i))
+            self.bodies = []
+            body = self.post(data=form)
+            os.utime(body.uploads[0]["path"], (i, i))
+        self.assertEqual(len(os.listdir(self.upload_dir)), 2)
+        self.assertTrue(os.path.exists(body.uploads[0]["path"]))
+
+    def test_prune_keeps_new_upload(self):
+        os.makedirs(self.upload_dir)
+        for name, mtime in [("old", 1), ("new", 2)]:
+            with open(os.path.join(self.upload_dir, name), "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(os.path.join(self.upload_dir, name), (mtime, mtime))
+        self.assertEqual(prune_uploads(self.upload_dir, 50, keep=os.path.join(self.upload_dir, "old")), 1)
+        self.assertEqual(os.listdir(self.upload_dir), ["old"])
+
+    def test_uploads_not_stored(self):
+        self.reader.upload_dir = None
+        form = aiohttp.FormData()
+        form.add_field("file", b"data", filename="a.txt")
+        body = self.post(data=form)
+        self.assertIsNone(body.uploads[0]["path"])
+        self.assertFalse(os.path.exists(self.upload_dir))
+
+    def test_chunked_logging(self):
+        body = self.post(data={"a": "x" * 90})
+        body.fields["a"] = "x" * 2500
+        with self.assertLogs("snare.server", level="INFO") as logs:
+            body.log(logging.getLogger("snare.server"))
+        self.assertEqual(len(logs.output), 4)
+        self.assertIn("a [3/3]", logs.output[3])
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
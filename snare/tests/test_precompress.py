@@ -0,0 +1,52 @@
+import unittest
+import gzip
+import shutil
+import os
+from snare.utils import precompress
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        self.meta = {
+            "/index.html": {"hash": "hash_index", "headers": [{"Content-Type": "text/html; charset=utf-8"}]},
+            "/logo.png": {"hash": "hash_png", "content_type": "image/png"},
+            "/small.js": {"hash": "hash_js", "headers": [{"Content-Type": "application/javascript"}]},
+            "/style.css": {"hash": "hash_css", "headers": [{"Content-Type": "text/css"}]},
+        }
+        self.html = b"<html><body>" + b"<p>honeypot</p>" * 100 + b"</body></html>"
+        with open(os.path.join(self.main_page_path, "hash_index"), "wb") as f:
+            f.write(self.html)
+        with open(os.path.join(self.main_page_path, "hash_png"), "wb") as f:
+            f.write(b"\x89PNG" * 100)
+        with open(os.path.join(self.main_page_path, "hash_js"), "wb") as f:
+            f.write(b"var a;")
+        self.css = b"p { color: red; }\n" * 100
+        with open(os.path.join(self.main_page_path, "hash_css"), "wb") as f:
+            f.write(self.css)
+
+    def test_precompress_pages(self):
+        precompress.precompress_pages(self.main_page_path, self.meta)
+        with open(os.path.join(self.main_page_path, "hash_css.gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), self.css)
+        # HTML is compressed after rendering, never from disk
+        self.assertFalse(os.path.exists(os.path.join(self.main_page_path, "hash_index.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.main_page_path, "hash_png.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.main_page_path, "hash_js.gz")))
+
+    def test_precompress_skips_up_to_date(self):
+        precompress.precompress_pages(self.main_page_path, self.meta)
+        self.assertEqual(precompress.precompress_pages(self.main_page_path, self.meta), 0)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(precompress.negotiate_encoding("gzip, deflate, br", ("br", "gzip")), "br")
+        self.assertEqual(precompress.negotiate_encoding("gzip, deflate, br", ("gzip",)), "gzip")
+        self.assertEqual(precompress.negotiate_encoding("*", ("gzip",)), "gzip")
+        self.assertIsNone(precompress.negotiate_encoding("gzip;q=0", ("gzip",)))
+        self.assertIsNone(precompress.negotiate_encoding("identity", ("gzip",)))
+        self.assertIsNone(precompress.negotiate_encoding(None, ("gzip",)))
+
+    def tearDown(self):
+        shutil.rmtree(self.main_page_path)
@@ -0,0 +1,60 @@
+import unittest
+import asyncio
+import glob
+import os
+import shutil
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from snare.profiler import Profiler
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = generate_unique_path()
+        self.profiler = Profiler(self.profile_dir, slow_request_threshold=0.0)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def test_on_demand_profile(self):
+        async def test():
+            path = self.profiler.start(0.01)
+            self.assertIsNotNone(path)
+            self.assertIsNone(self.profiler.start(0.01))
+            await asyncio.sleep(0.05)
+            return path
+
+        with self.assertLogs("snare.profiler", level="INFO"):
+            path = self.loop.run_until_complete(test())
+            self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertFalse(self.profiler.busy)
+        self.assertTrue(os.path.isfile(path))
+
+    def test_slow_request_profile(self):
+        async def handler(request):
+            return web.Response(text="ok")
+
+        async def test():
+            middleware = self.profiler.create_middleware()
+            response = await middleware(make_mocked_request("GET", "/"), handler)
+            await asyncio.sleep(0.05)
+            return response
+
+        response = self.loop.run_until_complete(test())
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(glob.glob(os.path.join(self.profile_dir, "slow-*.prof"))), 1)
+
+    def test_fast_request_not_kept(self):
+        self.profiler.slow_request_threshold = 60
+
+        async def handler(request):
+            return web.Response(text="ok")
+
+        middleware = self.profiler.create_middleware()
+        self.loop.run_until_complete(middleware(make_mocked_request("GET", "/"), handler))
+        self.assertFalse(os.path.exists(self.profile_dir))
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
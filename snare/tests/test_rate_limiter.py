@@ -0,0 +1,105 @@
+import unittest
+import asyncio
+from unittest import mock
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from snare.rate_limiter import RateLimiter, TokenBuckets, subnet_of
+
+
+class TestTokenBuckets(unittest.TestCase):
+    def test_burst_then_rate(self):
+        buckets = TokenBuckets(rate=1, burst=2)
+        self.assertTrue(buckets.take("a", 100))
+        self.assertTrue(buckets.take("a", 100))
+        self.assertFalse(buckets.take("a", 100))
+        self.assertTrue(buckets.take("a", 101))
+        self.assertTrue(buckets.take("b", 101))
+
+    def test_refilled_buckets_expire(self):
+        buckets = TokenBuckets(rate=1, burst=2)
+        buckets.take("a", 100)
+        buckets.take("b", 100)
+        buckets.take("c", 105)
+        self.assertEqual(len(buckets), 1)
+
+    def test_table_size(self):
+        buckets = TokenBuckets(rate=1, burst=2, max_entries=2)
+        for key in "abc":
+            buckets.take(key, 100)
+        self.assertEqual(list(buckets.buckets), ["b", "c"])
+
+    def test_subnet_of(self):
+        self.assertEqual(subnet_of("192.0.2.17"), "192.0.2")
+        self.assertEqual(subnet_of("2001:db8::1"), "2001:db8::/64")
+        self.assertEqual(subnet_of("::ffff:192.0.2.17"), "192.0.2")
+        self.assertEqual(subnet_of("::ffff:c000:211"), "192.0.2")
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.handler_calls = 0
+
+    def request(self, ip):
+        transport = mock.Mock()
+        transport.get_extra_info.return_value = (ip, 40000)
+        return make_mocked_request("GET", "/", transport=transport)
+
+    async def handler(self, request):
+        self.handler_calls += 1
+        return web.Response(text="ok")
+
+    def run_requests(self, limiter, ips):
+        middleware = limiter.create_middleware()
+
+        async def test():
+            return [(await middleware(self.request(ip), self.handler)).status for ip in ips]
+
+        return self.loop.run_until_complete(test())
+
+    def test_client_limit(self):
+        limiter = RateLimiter(rate=0.001, burst=2, server_header="nginx")
+        statuses = self.run_requests(limiter, ["192.0.2.1"] * 3 + ["192.0.2.2"])
+        self.assertEqual(statuses, [200, 200, 503, 200])
+        self.assertEqual(self.handler_calls, 3)
+        self.assertEqual(limiter.stats()["rejected_client"], 1)
+
+    def test_subnet_limit(self):
+        limiter = RateLimiter(rate=0.001, burst=5, subnet_rate=0.001, subnet_burst=2)
+        statuses = self.run_requests(limiter, ["192.0.2.1", "192.0.2.2", "192.0.2.3", "198.51.100.1"])
+        self.assertEqual(statuses, [200, 200, 503, 200])
+        self.assertEqual(limiter.stats()["rejected_subnet"], 1)
+
+    def test_in_flight_cap(self):
+        limiter = RateLimiter(max_in_flight=1)
+        middleware = limiter.create_middleware()
+        started = asyncio.Event()
+
+        async def slow_handler(request):
+            started.set()
+            await asyncio.sleep(0.01)
+            return web.Response(text="ok")
+
+        async def test():
+            first = asyncio.ensure_future(middleware(self.request("192.0.2.1"), slow_handler))
+            await started.wait()
+            second = await middleware(self.request("192.0.2.2"), slow_handler)
+            return (await first).status, second.status
+
+        self.assertEqual(self.loop.run_until_complete(test()), (200, 503))
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_tarpit(self):
+        limiter = RateLimiter(rate=0.001, burst=1, tarpit_delay=0.05)
+        started = self.loop.time()
+        statuses = self.run_requests(limiter, ["192.0.2.1"] * 2)
+        self.assertEqual(statuses, [200, 503])
+        self.assertGreaterEqual(self.loop.time() - started, 0.05)
+        self.assertEqual(limiter.tarpitted, 0)
+
+    def test_disabled(self):
+        self.assertFalse(RateLimiter().enabled)
+        self.assertTrue(RateLimiter(max_in_flight=10).enabled)
+
+    def tearDown(self):
+        self.loop.close()
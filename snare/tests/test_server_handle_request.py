@@ -74,7 +74,7 @@ class TestHandleRequest(unittest.TestCase):
         )
         self.handler.tanner_handler.create_data = Mock(return_value=self.request_data)
         self.handler.tanner_handler.submit_data = AsyncMock(return_value=event_result)
-        self.handler.submit_slurp = AsyncMock()
+        self.handler.slurp_publisher = Mock()
         web.Response.add_header = Mock()
         web.Response.write = Mock()
         web.Response.send_headers = Mock()
@@ -107,14 +107,16 @@ class TestHandleRequest(unittest.TestCase):
             await self.handler.handle_request(self.request)
 
         self.loop.run_until_complete(test())
-        self.handler.submit_slurp.assert_called_with(self.request.path_qs)
+        self.handler.slurp_publisher.put.assert_called_with(self.request.path_qs)
 
     def test_parse_response(self):
         async def test():
             await self.handler.handle_request(self.request)
 
         self.loop.run_until_complete(test())
-        self.handler.tanner_handler.parse_tanner_response.assert_called_with(self.request.path_qs, {"type": 1})
+        self.handler.tanner_handler.parse_tanner_response.assert_called_with(
+            self.request.path_qs, {"type": 1}, self.request.headers, self.request.method
+        )
 
     def test_no_prev_sess_uuid(self):
         self.request_data = {
@@ -132,7 +134,22 @@ class TestHandleRequest(unittest.TestCase):
             await self.handler.handle_request(self.request)
 
         self.loop.run_until_complete(test())
-        self.handler.tanner_handler.parse_tanner_response.assert_called_with(self.request.path_qs, {"type": 1})
+        self.handler.tanner_handler.parse_tanner_response.assert_called_with(
+            self.request.path_qs, {"type": 1}, self.request.headers, self.request.method
+        )
+
+    def test_request_log(self):
+        self.handler.request_logger = Mock()
+
+        async def test():
+            await self.handler.handle_request(self.request)
+
+        self.loop.run_until_complete(test())
+        event = self.handler.request_logger.info.call_args[0][0]
+        self.assertEqual(event["path"], self.request.path_qs)
+        self.assertEqual(event["status"], 200)
+        self.assertEqual(event["detection_type"], 1)
+        self.assertIn("total_ms", event)
 
     def tearDown(self):
         shutil.rmtree(self.main_page_path)
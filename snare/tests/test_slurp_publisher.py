@@ -0,0 +1,64 @@
+import unittest
+import asyncio
+from unittest import mock
+from snare.utils.asyncmock import AsyncMock
+from snare.slurp_publisher import SlurpPublisher
+
+
+class TestSlurpPublisher(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.response = mock.Mock(status=200)
+        self.response.release = AsyncMock()
+        self.client = mock.Mock()
+        self.client.session.post = AsyncMock(return_value=self.response)
+        self.publisher = SlurpPublisher(self.client, "slurp.test", "secret", max_size=3, batch_size=10, batch_age=0.01)
+
+    def publish(self, messages):
+        async def test():
+            for message in messages:
+                self.publisher.put(message)
+            await self.publisher.close()
+
+        self.loop.run_until_complete(test())
+
+    def test_single_message(self):
+        self.publish(["/index.html?a=1&b=2"])
+        args, kwargs = self.client.session.post.call_args
+        self.assertEqual(args[0], "https://slurp.test:8080/api")
+        self.assertEqual(kwargs["params"], {"auth": "secret", "chan": "snare_test", "msg": "/index.html?a=1&b=2"})
+        self.assertEqual(kwargs["json"], "/index.html?a=1&b=2")
+
+    def test_batch_sent_concurrently(self):
+        self.publish(["/a", "/b"])
+        self.assertEqual(self.client.session.post.call_count, 2)
+        messages = [call[1]["params"]["msg"] for call in self.client.session.post.call_args_list]
+        self.assertEqual(sorted(messages), ["/a", "/b"])
+        self.assertEqual(self.publisher.stats()["sent"], 2)
+        self.assertEqual(self.publisher.stats()["batches"], 1)
+
+    def test_queue_bound(self):
+        self.publish(["/{}".format(i) for i in range(5)])
+        self.assertEqual(self.publisher.stats()["dropped"], 2)
+        self.assertEqual(self.publisher.stats()["sent"], 3)
+
+    def test_retry_with_backoff(self):
+        failed = mock.Mock(status=500)
+        failed.release = AsyncMock()
+        self.client.session.post = AsyncMock(side_effect=[failed, self.response])
+        with mock.patch("snare.slurp_publisher.RETRY_BACKOFF", 0.01), self.assertLogs(
+            "snare.slurp_publisher", level="ERROR"
+        ):
+            self.publish(["/a"])
+        self.assertEqual(self.publisher.stats()["retried"], 1)
+        self.assertEqual(self.publisher.stats()["sent"], 1)
+
+    def test_give_up(self):
+        self.publisher.retries = 0
+        self.client.session.post = AsyncMock(side_effect=OSError("unreachable"))
+        with self.assertLogs("snare.slurp_publisher", level="ERROR"):
+            self.publish(["/a"])
+        self.assertEqual(self.publisher.stats()["failed"], 1)
+
+    def tearDown(self):
+        self.loop.close()
@@ -0,0 +1,47 @@
+import unittest
+import socket
+from unittest import mock
+from snare.supervisor import Supervisor, create_reuseport_socket
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.sockets = [create_reuseport_socket("127.0.0.1", 0)]
+        port = self.sockets[0].getsockname()[1]
+        self.sockets.append(create_reuseport_socket("127.0.0.1", port))
+        self.serve = mock.Mock()
+        self.supervisor = Supervisor(self.sockets, self.serve)
+
+    def test_sockets_share_port(self):
+        self.assertEqual(self.sockets[0].getsockname(), self.sockets[1].getsockname())
+        self.assertEqual(self.sockets[0].getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT), 1)
+
+    @mock.patch("os.wait")
+    @mock.patch("os.fork")
+    def test_restart_crashed_worker(self, fork, wait):
+        self.supervisor.sockets = self.sockets[:1]
+        fork.side_effect = [101, 102]
+        exits = [(101, 256), (102, 0)]
+
+        def worker_exit():
+            if len(exits) == 1:
+                self.supervisor.stopping = True
+            return exits.pop(0)
+
+        wait.side_effect = worker_exit
+        with mock.patch("signal.signal"), mock.patch("time.sleep"):
+            self.supervisor.run()
+        self.assertEqual(fork.call_count, 2)
+        self.assertEqual(self.supervisor.workers, {})
+        self.serve.assert_not_called()
+
+    @mock.patch("os.kill")
+    def test_stop(self, kill):
+        self.supervisor.workers = {101: (0, 0), 102: (1, 0)}
+        self.supervisor.stop()
+        self.assertTrue(self.supervisor.stopping)
+        self.assertEqual(kill.call_count, 2)
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
@@ -0,0 +1,111 @@
+import unittest
+import asyncio
+import argparse
+import shutil
+import os
+import aiohttp
+from snare.utils.asyncmock import AsyncMock
+from snare.tanner_handler import TannerHandler
+from snare.utils.page_path_generator import generate_unique_path
+
+
+class TestGetEventResult(unittest.TestCase):
+    def setUp(self):
+        run_args = argparse.ArgumentParser()
+        self.main_page_path = generate_unique_path()
+        os.makedirs(self.main_page_path)
+        args = run_args.parse_args([])
+        args_dict = vars(args)
+        args_dict["full_page_path"] = self.main_page_path
+        args.tanner = "tanner.mushmush.org"
+        args.no_dorks = True
+        args.detection_cache_ttl = 60
+        self.data = {"method": "GET", "path": "/index.html", "uuid": "test_uuid", "cookies": {"sess_uuid": "abc"}}
+        self.event_result = dict(
+            response=dict(message=dict(detection={"name": "index", "type": 1}, sess_uuid="test_uuid"))
+        )
+        self.handler = TannerHandler(args, {}, "test_uuid")
+        self.handler.submit_data = AsyncMock(return_value=self.event_result)
+        self.loop = asyncio.new_event_loop()
+        self.results = []
+
+    def test_cache_miss_waits_for_tanner(self):
+        async def test():
+            self.results.append(await self.handler.get_event_result(self.data))
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.results, [self.event_result])
+
+    def test_cache_hit_forwards_event(self):
+        async def test():
+            self.results.append(await self.handler.get_event_result(self.data))
+            self.results.append(await self.handler.get_event_result(self.data))
+            await self.handler.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.results[1]["response"]["message"]["detection"], {"name": "index", "type": 1})
+        self.assertNotIn("sess_uuid", self.results[1]["response"]["message"])
+        self.assertEqual(self.handler.submit_data.call_count, 2)
+        self.assertEqual(self.handler.detection_cache.hits, 1)
+
+    def test_post_not_cached(self):
+        self.data.update(method="POST", post_data={"id": "1' or 1=1"})
+
+        async def test():
+            await self.handler.get_event_result(self.data)
+            await self.handler.get_event_result(self.data)
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.handler.submit_data.call_count, 2)
+
+    def test_new_session_not_cached(self):
+        del self.data["cookies"]
+
+        async def test():
+            await self.handler.get_event_result(self.data)
+            self.results.append(await self.handler.get_event_result(self.data))
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.handler.submit_data.call_count, 2)
+        self.assertIn("sess_uuid", self.results[0]["response"]["message"])
+
+    def test_cache_disabled(self):
+        self.handler.detection_cache = None
+
+        async def test():
+            await self.handler.get_event_result(self.data)
+            await self.handler.get_event_result(self.data)
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.handler.submit_data.call_count, 2)
+
+    def test_tanner_down_serves_locally(self):
+        self.handler.detection_cache = None
+        self.handler.submit_data = AsyncMock(side_effect=aiohttp.ClientError())
+
+        async def test():
+            self.results.append(await self.handler.get_event_result(self.data))
+            self.results.append(await self.handler.get_event_result(self.data))
+            await self.handler.event_pipeline.close()
+
+        with self.assertLogs("snare.circuit_breaker", level="ERROR"):
+            self.handler.circuit_breaker.trip()
+        with self.assertLogs("snare.event_pipeline", level="ERROR") as logs:
+            self.loop.run_until_complete(test())
+        self.assertEqual(self.results[0], self.results[1])
+        self.assertEqual(self.results[0]["response"]["message"]["detection"]["type"], 1)
+        self.assertEqual(self.handler.submit_data.call_count, 0)
+        self.assertEqual(self.handler.event_pipeline.stats()["enqueued"], 2)
+        self.assertIn("2 events were not sent", logs.output[0])
+
+    def test_tanner_error_without_breaker(self):
+        self.handler.detection_cache = None
+        self.handler.circuit_breaker = None
+        self.handler.submit_data = AsyncMock(side_effect=aiohttp.ClientError())
+
+        with self.assertRaises(aiohttp.ClientError):
+            self.loop.run_until_complete(self.handler.get_event_result(self.data))
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.main_page_path)
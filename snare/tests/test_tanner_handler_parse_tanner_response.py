@@ -4,10 +4,14 @@ import argparse
 import shutil
 import os
 import json
+import gzip
+import hashlib
+import pathlib
 import multidict
 from snare.utils.asyncmock import AsyncMock
 from snare.utils.page_path_generator import generate_unique_path
 from snare.tanner_handler import TannerHandler
+from snare.path_resolver import PathResolver
 
 
 class TestParseTannerResponse(unittest.TestCase):
@@ -52,6 +56,15 @@ class TestParseTannerResponse(unittest.TestCase):
 
     def test_parse_type_one(self):
         self.detection = {"type": 1}
+        page = self.handler.path_resolver.resolve("/")
+        self.headers = multidict.CIMultiDict(
+            [
+                ("Content-Type", "text/html"),
+                ("ETag", page.etag),
+                ("Last-Modified", page.last_modified),
+                ("Vary", "Accept-Encoding"),
+            ]
+        )
 
         async def test():
             (
@@ -68,6 +81,15 @@ class TestParseTannerResponse(unittest.TestCase):
     def test_parse_type_one_query(self):
         self.requested_name = "/?"
         self.detection = {"type": 1}
+        page = self.handler.path_resolver.resolve("/")
+        self.headers = multidict.CIMultiDict(
+            [
+                ("Content-Type", "text/html"),
+                ("ETag", page.etag),
+                ("Last-Modified", page.last_modified),
+                ("Vary", "Accept-Encoding"),
+            ]
+        )
 
         async def test():
             (
@@ -122,6 +144,27 @@ class TestParseTannerResponse(unittest.TestCase):
         expected_result = [self.expected_content, self.headers, self.status_code]
         self.assertCountEqual(real_result, expected_result)
 
+    def test_parse_type_two_splice(self):
+        self.handler.meta["/upper.html"] = {"hash": "hash_upper", "headers": [{"Content-Type": "text/html"}]}
+        self.handler.meta["/nobody.html"] = {"hash": "hash_nobody", "headers": [{"Content-Type": "text/html"}]}
+        with open(os.path.join(self.main_page_path, "hash_upper"), "w") as f:
+            f.write("<HTML><BODY><p>page</p></BODY></HTML>")
+        with open(os.path.join(self.main_page_path, "hash_nobody"), "w") as f:
+            f.write("<p>page</p>")
+        self.handler.path_resolver = PathResolver(self.handler.meta, self.main_page_path, "/index.html")
+        results = []
+
+        async def test():
+            for page in ["/upper.html", "/upper.html", "/nobody.html"]:
+                detection = {"type": 2, "payload": {"page": page, "value": "<script>alert(1)</script>"}}
+                results.append(await self.handler.parse_tanner_response(self.requested_name, detection))
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(results[0][0], b"<HTML><BODY><p>page</p><div><script>alert(1)</script></div></BODY></HTML>")
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(self.handler.injection_points, {"hash_upper": 23, "hash_nobody": -1})
+        self.assertEqual(results[2][0], b"<p>page</p><div><script>alert(1)</script></div>")
+
     def test_parse_type_two_with_headers(self):
         self.detection = {
             "type": 2,
@@ -212,6 +255,106 @@ class TestParseTannerResponse(unittest.TestCase):
         self.loop.run_until_complete(test())
         self.handler.html_handler.handle_content.assert_called_with(self.call_content)
 
+    def test_parse_type_one_static_asset(self):
+        self.handler.meta["/big.png"] = {"hash": "hash_png", "headers": [{"Content-Type": "image/png"}]}
+        with open(os.path.join(self.main_page_path, "hash_png"), "wb") as f:
+            f.write(b"\0" * (self.handler.sendfile_threshold + 1))
+        self.handler.path_resolver = PathResolver(self.handler.meta, self.main_page_path, "/index.html")
+        self.requested_name = "/big.png"
+        self.detection = {"type": 1}
+
+        async def test():
+            (
+                self.res1,
+                self.res2,
+                self.res3,
+            ) = await self.handler.parse_tanner_response(self.requested_name, self.detection)
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.res1, pathlib.Path(self.main_page_path, "hash_png"))
+        self.assertEqual(self.res2["Content-Type"], "image/png")
+        self.assertEqual(self.res2["ETag"], '"{}"'.format(hashlib.md5(b"\0" * (64 * 1024 + 1)).hexdigest()))
+        self.assertEqual(self.res3, 200)
+        self.assertEqual(self.handler.page_cache.misses, 0)
+
+    def test_parse_type_one_gzip(self):
+        self.handler.html_handler.handle_content = AsyncMock(return_value=b"<p>" * 200)
+        self.detection = {"type": 1}
+        request_headers = multidict.CIMultiDict([("Accept-Encoding", "gzip, deflate")])
+
+        async def test():
+            (
+                self.res1,
+                self.res2,
+                self.res3,
+            ) = await self.handler.parse_tanner_response(self.requested_name, self.detection, request_headers)
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(gzip.decompress(self.res1), b"<p>" * 200)
+        self.assertEqual(self.res2["Content-Encoding"], "gzip")
+        self.assertEqual(self.res2["Vary"], "Accept-Encoding")
+
+    def test_parse_type_one_precompressed(self):
+        self.handler.meta["/style.css"] = {"hash": "hash_css", "headers": [{"Content-Type": "text/css"}]}
+        with open(os.path.join(self.main_page_path, "hash_css"), "w") as f:
+            f.write("body {}")
+        with open(os.path.join(self.main_page_path, "hash_css.gz"), "wb") as f:
+            f.write(gzip.compress(b"body {}"))
+        self.handler.path_resolver = PathResolver(self.handler.meta, self.main_page_path, "/index.html")
+        self.detection = {"type": 1}
+        results = []
+
+        async def test():
+            for accept_encoding in ["gzip;q=0, br", "br;q=0.5, gzip;q=1.0"]:
+                request_headers = multidict.CIMultiDict([("Accept-Encoding", accept_encoding)])
+                results.append(await self.handler.parse_tanner_response("/style.css", self.detection, request_headers))
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(results[0][0], b"body {}")
+        self.assertNotIn("Content-Encoding", results[0][1])
+        self.assertEqual(gzip.decompress(results[1][0]), b"body {}")
+        self.assertEqual(results[1][1]["Content-Encoding"], "gzip")
+
+    def test_parse_type_one_not_modified(self):
+        page = self.handler.path_resolver.resolve("/")
+        self.detection = {"type": 1}
+        results = []
+
+        async def test():
+            for request_headers in [
+                {"If-None-Match": '"other", ' + page.etag[2:]},
+                {"If-Modified-Since": page.last_modified},
+                {"If-None-Match": '"other"', "If-Modified-Since": page.last_modified},
+            ]:
+                request_headers = multidict.CIMultiDict(request_headers)
+                results.append(
+                    await self.handler.parse_tanner_response(self.requested_name, self.detection, request_headers)
+                )
+
+        self.loop.run_until_complete(test())
+        self.assertEqual([result[2] for result in results], [304, 304, 200])
+        self.assertIsNone(results[0][0])
+        self.assertEqual(results[0][1]["ETag"], page.etag)
+        self.assertTrue(page.etag.startswith("W/"))
+        self.handler.html_handler.handle_content.assert_called_once_with(b"<html><body></body></html>")
+
+    def test_parse_not_modified_only_for_get(self):
+        page = self.handler.path_resolver.resolve("/")
+        self.detection = {"type": 1}
+        request_headers = multidict.CIMultiDict({"If-None-Match": page.etag})
+        results = []
+
+        async def test():
+            for method in ["POST", "HEAD"]:
+                results.append(
+                    await self.handler.parse_tanner_response(
+                        self.requested_name, self.detection, request_headers, method
+                    )
+                )
+
+        self.loop.run_until_complete(test())
+        self.assertEqual([result[2] for result in results], [200, 304])
+
     def test_parse_exception(self):
         self.detection = {}
         self.expected_content = self.page_content
@@ -106,4 +106,5 @@ class TestSubmitData(unittest.TestCase):
             self.loop.run_until_complete(test())
 
     def tearDown(self):
+        self.loop.run_until_complete(self.handler.client.close())
         shutil.rmtree(self.main_page_path)
@@ -0,0 +1,39 @@
+import logging
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+# fastest first, html.parser ships with python and is always available
+PARSERS = ("lxml", "html5lib", "html.parser")
+DEFAULT_PARSER = "html.parser"
+FRAGMENT_PARSER = "html.parser"
+
+logger = logging.getLogger(__name__)
+
+
+def available_parsers():
+    return [name for name in PARSERS if builder_registry.lookup(name) is not None]
+
+
+def select_parser(name=None):
+    """Returns the BeautifulSoup tree builder to use, falling back to html.parser when one is missing"""
+    if not name:
+        return DEFAULT_PARSER
+    available = available_parsers()
+    if name == "auto":
+        return available[0]
+    if name not in PARSERS:
+        raise ValueError("Unknown HTML parser: {}".format(name))
+    if name not in available:
+        logger.warning("HTML parser %s is not installed, falling back to %s", name, DEFAULT_PARSER)
+        return DEFAULT_PARSER
+    return name
+
+
+def parse_html(markup, parser=DEFAULT_PARSER):
+    return BeautifulSoup(markup, parser)
+
+
+def parse_fragment(markup):
+    # lxml and html5lib wrap fragments in html/body tags, html.parser keeps them as they are
+    return BeautifulSoup(markup, FRAGMENT_PARSER)
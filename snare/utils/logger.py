@@ -1,5 +1,18 @@
+import atexit
+import datetime
+import glob
+import gzip
+import json
 import logging
 import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+DEFAULT_LOG_BATCH_SIZE = 100
+REQUEST_LOGGER = "snare.requests"
 
 
 class LevelFilter(logging.Filter):
@@ -14,9 +27,173 @@ class LevelFilter(logging.Filter):
     # "<" instead of "<=": since logger.setLevel is inclusive, this should be exclusive
 
 
+class JsonFormatter(logging.Formatter):
+    """Formats records whose message is a dict as one JSON object per line"""
+
+    def format(self, record):
+        event = {"time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat()}
+        if isinstance(record.msg, dict):
+            event.update(record.msg)
+        else:
+            event["message"] = record.getMessage()
+        return json.dumps(event, default=str)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates on size or age into timestamped segments, which are gzipped by a background thread"""
+
+    def __init__(self, filename, max_bytes=0, max_age=0, backup_count=0, encoding="utf-8"):
+        self.max_age = max_age
+        self.opened = time.time()
+        self.compressors = []
+        self.prune_lock = threading.Lock()
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+
+    def _open(self):
+        self.opened = time.time()
+        return super()._open()
+
+    def shouldRollover(self, record):
+        if (
+            self.max_age > 0
+            and self.stream is not None
+            and time.time() - self.opened >= self.max_age
+            and self.stream.tell() > 0
+        ):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.isfile(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            segment = "{}.{}".format(self.baseFilename, time.strftime("%Y%m%d-%H%M%S"))
+            suffix = 0
+            while os.path.exists(segment) or os.path.exists(segment + ".gz"):
+                suffix += 1
+                segment = "{}.{}-{}".format(self.baseFilename, time.strftime("%Y%m%d-%H%M%S"), suffix)
+            os.rename(self.baseFilename, segment)
+            self.compressors = [thread for thread in self.compressors if thread.is_alive()]
+            compressor = threading.Thread(target=self.compress_segment, args=(segment,), daemon=True)
+            compressor.start()
+            self.compressors.append(compressor)
+        if not self.delay:
+            self.stream = self._open()
+
+    def compress_segment(self, segment):
+        try:
+            with open(segment, "rb") as source, gzip.open(segment + ".gz.tmp", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.rename(segment + ".gz.tmp", segment + ".gz")
+            os.remove(segment)
+            self.remove_old_segments()
+        except OSError as e:
+            logging.getLogger(__name__).error("Error compressing log segment %s: %s", segment, e)
+
+    def remove_old_segments(self):
+        if self.backupCount <= 0:
+            return
+        # compressor threads of back to back rollovers prune one at a time
+        with self.prune_lock:
+            segments = sorted(glob.glob(glob.escape(self.baseFilename) + ".*.gz"), key=os.path.getmtime)
+            for segment in segments[: -self.backupCount]:
+                os.remove(segment)
+
+    def close(self):
+        super().close()
+        for compressor in self.compressors:
+            compressor.join()
+        self.compressors = []
+
+
+class DeferredFlushFileHandler(CompressingRotatingFileHandler):
+    """File handler that leaves flushing to the queue listener, once per batch of records"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if isinstance(record.msg, dict):
+            # structured records are formatted by the listener's handlers
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Writes queued records from a background thread, flushing the files once per batch"""
+
+    def __init__(self, queue, *handlers, batch_size=DEFAULT_LOG_BATCH_SIZE):
+        super().__init__(queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+
+    def enqueue_sentinel(self):
+        # wait for room, the records queued before the sentinel must not be lost
+        self.queue.put(self._sentinel)
+
+    def flush(self):
+        for handler in self.handlers:
+            if isinstance(handler, DeferredFlushFileHandler):
+                handler.flush_batch()
+            else:
+                handler.flush()
+
+    def _monitor(self):
+        q = self.queue
+        stopped = False
+        while not stopped:
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stopped = True
+                else:
+                    self.handle(record)
+            self.flush()
+            for _ in batch:
+                q.task_done()
+
+
 class Logger:
+    # (queue handler, listener) pairs of the loggers running in queued mode
+    listeners = []
+    # (logger, handler) pairs of every handler created by add_handlers
+    handlers = []
+
     @staticmethod
-    def create_logger(debug_filename, err_filename, logger_name):
+    def create_logger(
+        debug_filename,
+        err_filename,
+        logger_name,
+        queue_size=0,
+        batch_size=DEFAULT_LOG_BATCH_SIZE,
+        max_bytes=0,
+        max_age=0,
+        backup_count=0,
+    ):
+        """Queue_size > 0 moves the file writes to a background thread behind a queue of that size"""
+        file_handler = DeferredFlushFileHandler if queue_size > 0 else CompressingRotatingFileHandler
         logger = logging.getLogger(logger_name)
         logger.setLevel(logging.DEBUG)
         logger.propagate = False
@@ -26,21 +203,73 @@ class Logger:
         )
 
         # ERROR log to 'snare.err'
-        error_log_handler = logging.handlers.RotatingFileHandler(err_filename, encoding="utf-8")
+        error_log_handler = file_handler(err_filename, max_bytes, max_age, backup_count)
         error_log_handler.setLevel(logging.ERROR)
         error_log_handler.setFormatter(formatter)
-        logger.addHandler(error_log_handler)
 
         # DEBUG log to 'snare.log'
-        debug_log_handler = logging.handlers.RotatingFileHandler(debug_filename, encoding="utf-8")
+        debug_log_handler = file_handler(debug_filename, max_bytes, max_age, backup_count)
         debug_log_handler.setLevel(logging.DEBUG)
         debug_log_handler.setFormatter(formatter)
         max_level_filter = LevelFilter(logging.ERROR)
         debug_log_handler.addFilter(max_level_filter)
-        logger.addHandler(debug_log_handler)
 
+        Logger.add_handlers(logger, [error_log_handler, debug_log_handler], queue_size, batch_size)
+        return logger
+
+    @staticmethod
+    def create_request_logger(
+        filename,
+        logger_name,
+        queue_size=0,
+        batch_size=DEFAULT_LOG_BATCH_SIZE,
+        max_bytes=0,
+        max_age=0,
+        backup_count=0,
+    ):
+        """One JSON object per request, log the events as dicts"""
+        file_handler = DeferredFlushFileHandler if queue_size > 0 else CompressingRotatingFileHandler
+        logger = logging.getLogger(logger_name)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        request_log_handler = file_handler(filename, max_bytes, max_age, backup_count)
+        request_log_handler.setFormatter(JsonFormatter())
+        Logger.add_handlers(logger, [request_log_handler], queue_size, batch_size)
         return logger
 
+    @staticmethod
+    def add_handlers(logger, handlers, queue_size, batch_size):
+        Logger.handlers.extend((logger, handler) for handler in handlers)
+        if queue_size <= 0:
+            for handler in handlers:
+                logger.addHandler(handler)
+            return
+        queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        listener = BatchingQueueListener(queue_handler.queue, *handlers, batch_size=batch_size)
+        listener.start()
+        if not Logger.listeners:
+            atexit.register(Logger.stop_listeners)
+        Logger.listeners.append((queue_handler, listener))
+        Logger.handlers.append((logger, queue_handler))
+        logger.addHandler(queue_handler)
+
+    @staticmethod
+    def stop_listeners():
+        """Writes out the queued records and stops the listener threads"""
+        for _, listener in Logger.listeners:
+            if listener._thread is not None:
+                listener.stop()
+
+    @staticmethod
+    def remove_handlers():
+        """Detaches and closes the handlers, so a forked worker can open log files of its own"""
+        Logger.stop_listeners()
+        for logger, handler in Logger.handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        Logger.handlers = []
+        Logger.listeners = []
+
     @staticmethod
     def create_clone_logger(log_filename, logger_name):
         logger = logging.getLogger(logger_name)
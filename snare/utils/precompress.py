@@ -0,0 +1,101 @@
+import gzip
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# preferred encoding first
+EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/x-javascript",
+    "application/json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+)
+MIN_COMPRESS_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+
+def available_encodings():
+    return [encoding for encoding in EXTENSIONS if encoding != "br" or brotli is not None]
+
+
+def is_compressible(content_type):
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(content, encoding, fast=False):
+    # fast mode is used for pages rendered at request time
+    if encoding == "br":
+        return brotli.compress(content, quality=5 if fast else 11)
+    return gzip.compress(content, compresslevel=6 if fast else 9)
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    if not accept_encoding or not encodings:
+        return None
+    accepted = set()
+    for token in accept_encoding.split(","):
+        name, _, params = token.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in EXTENSIONS:
+        if encoding in encodings and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+def page_content_type(page):
+    content_type = page.get("content_type")
+    if content_type:
+        return content_type
+    for header in page.get("headers", []):
+        for key, value in header.items():
+            if key.lower() == "content-type":
+                return value
+    return None
+
+
+def precompress_pages(directory, meta):
+    """Writes .gz (and .br when brotli is installed) siblings of compressible page files
+
+    HTML is rendered and compressed per response, so HTML pages are skipped.
+    """
+    written = 0
+    encodings = available_encodings()
+    for page in meta.values():
+        content_type = page_content_type(page)
+        if not is_compressible(content_type) or content_type.startswith("text/html"):
+            continue
+        path = os.path.join(directory, page["hash"])
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if stat.st_size < MIN_COMPRESS_SIZE:
+            continue
+        content = None
+        for encoding in encodings:
+            compressed_path = path + EXTENSIONS[encoding]
+            if os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= stat.st_mtime:
+                continue
+            if content is None:
+                with open(path, "rb") as fh:
+                    content = fh.read()
+            compressed = compress(content, encoding)
+            if len(compressed) >= len(content):
+                continue
+            with open(compressed_path, "wb") as fh:
+                fh.write(compressed)
+            written += 1
+    logger.debug("Wrote %d precompressed page files", written)
+    return written
@@ -7,7 +7,7 @@ import argparse
 import logging
 from os import walk
 from distutils.version import StrictVersion
-from bs4 import BeautifulSoup
+from snare.utils.html_parser import DEFAULT_PARSER, parse_html
 
 
 class VersionManager:
@@ -64,7 +64,7 @@ class Converter:
             json.dump(self.meta, mj)
 
 
-def add_meta_tag(page_dir, index_page, config, base_path):
+def add_meta_tag(page_dir, index_page, config, base_path, parser=DEFAULT_PARSER):
     google_content = config["WEB-TOOLS"]["google"]
     bing_content = config["WEB-TOOLS"]["bing"]
 
@@ -74,7 +74,7 @@ def add_meta_tag(page_dir, index_page, config, base_path):
     main_page_path = os.path.join(os.path.join(base_path, "pages"), page_dir, index_page)
     with open(main_page_path) as main:
         main_page = main.read()
-    soup = BeautifulSoup(main_page, "html.parser")
+    soup = parse_html(main_page, parser)
 
     if google_content and soup.find("meta", attrs={"name": "google-site-verification"}) is None:
         google_meta = soup.new_tag("meta")